@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks of the marshalling hot paths, against synthetic C buffers
+(no simulator nor remote API library needed).
+
+Reports per case: time per call (ns/op), Python memory blocks still allocated
+after the call (including its result), peak memory allocated during the call,
+and payload throughput (MB/s).
+
+    python3 benchmarks/run.py [-k filter] [--quick] [--json results.json]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+from pyrep.backend import CtypesBackend
+from pyrep.sensors import VisionSensor, LaserScanner2d
+from pyrep.vrep import vrepConst as vc
+# Imports the ctypes binding, even without the remoteApi library
+import synthetic
+from synthetic import v
+
+RESOLUTIONS = [(64, 48), (320, 240), (640, 480)]
+GROUP_SIZES = [30, 300, 3000]
+SCAN_SIZES = [684, 10000]
+SIGNAL_SIZES = [1024, 1024 * 1024]
+MODE = vc.simx_opmode_buffer
+
+
+def vision_cases(resolutions):
+    for width, height in resolutions:
+        params = {"width": width, "height": height}
+
+        def setup(width=width, height=height):
+            return synthetic.install_vision_sensor(width, height)
+
+        def image_list():
+            return v.simxGetVisionSensorImage(0, 1, 0, MODE)
+
+        def image_numpy():
+            return v.simxGetVisionSensorImageNumpy(0, 1, 0, MODE)
+
+        out = np.empty(width * height * 3, dtype=np.uint8)
+
+        def image_numpy_out(out=out):
+            return v.simxGetVisionSensorImageNumpy(0, 1, 0, MODE, out)
+
+        sensor = VisionSensor(CtypesBackend(), 0, 1)
+        ring_sensor = VisionSensor(CtypesBackend(), 0, 1)
+        ring_sensor.enable_frame_ring(3)
+
+        def raw_image(sensor=sensor):
+            return sensor.raw_image(op_mode=MODE)
+
+        def raw_image_ring(sensor=ring_sensor):
+            return sensor.raw_image(op_mode=MODE)
+
+        def depth_buffer(sensor=sensor):
+            return sensor.depth_buffer(op_mode=MODE)
+
+        yield "simxGetVisionSensorImage", params, setup, image_list
+        yield "simxGetVisionSensorImageNumpy", params, setup, image_numpy
+        yield "simxGetVisionSensorImageNumpy[out]", params, setup, image_numpy_out
+        yield "VisionSensor.raw_image", params, setup, raw_image
+        yield "VisionSensor.raw_image[ring]", params, setup, raw_image_ring
+        yield "VisionSensor.depth_buffer", params, \
+            lambda width=width, height=height: synthetic.install_vision_sensor(width, height) // 3 * 4, \
+            depth_buffer
+
+
+def group_data_cases(sizes):
+    for count in sizes:
+        def group_data():
+            return v.simxGetObjectGroupData(0, vc.sim_object_joint_type, 16, MODE)
+
+        yield "simxGetObjectGroupData[joints]", {"objects": count}, \
+            lambda count=count: synthetic.install_object_group_data(count, 2, 2, False), group_data
+        yield "simxGetObjectGroupData[names]", {"objects": count}, \
+            lambda count=count: synthetic.install_object_group_data(count, 0, 0, True), group_data
+
+
+def unpack_cases(sizes):
+    for beams in sizes:
+        packed = bytes(v.simxPackFloats(np.arange(beams * 3, dtype=np.float32)))
+        params = {"floats": beams * 3}
+
+        def unpack_list(packed=packed):
+            return v.simxUnpackFloats(packed)
+
+        def unpack_array(packed=packed):
+            return v.simxUnpackFloats(packed, asArray=True)
+
+        scanner = LaserScanner2d(CtypesBackend(), 0, 1)
+
+        def laser_scan(scanner=scanner):
+            return scanner.read(op_mode=MODE)
+
+        yield "simxUnpackFloats", params, lambda packed=packed: len(packed), unpack_list
+        yield "simxUnpackFloats[asArray]", params, lambda packed=packed: len(packed), unpack_array
+        yield "LaserScanner2d.read", {"beams": beams}, \
+            lambda packed=packed: synthetic.install_string_signal(packed), laser_scan
+
+
+def signal_cases(sizes):
+    for size in sizes:
+        value = bytes(range(256)) * (size // 256)
+
+        def signal_copy():
+            return v.simxGetStringSignal(0, "signal", MODE)
+
+        def signal_view():
+            return v.simxGetStringSignal(0, "signal", MODE, copy=False)
+
+        yield "simxGetStringSignal", {"bytes": size}, \
+            lambda value=value: synthetic.install_string_signal(value), signal_copy
+        yield "simxGetStringSignal[view]", {"bytes": size}, \
+            lambda value=value: synthetic.install_string_signal(value), signal_view
+
+
+def measure(function, min_time):
+    number = 1
+    while timeit.timeit(function, number=number) < min_time / 5:
+        number *= 2
+    best = min(timeit.repeat(function, number=number, repeat=3))
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    result = function()
+    blocks = sys.getallocatedblocks() - blocks
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best / number, blocks, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="small sizes and short timings")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds spent timing each case")
+    parser.add_argument("--json", dest="json_path", help="write the results to this JSON file")
+    args = parser.parse_args()
+    min_time = 0.05 if args.quick else args.min_time
+    cut = 1 if args.quick else None
+
+    cases = [
+        vision_cases(RESOLUTIONS[:cut]),
+        group_data_cases(GROUP_SIZES[:cut]),
+        unpack_cases(SCAN_SIZES[:cut]),
+        signal_cases(SIGNAL_SIZES[:cut]),
+    ]
+    results = []
+    print("{:40} {:24} {:>14} {:>8} {:>12} {:>10}".format(
+        "case", "params", "ns/op", "blocks", "peak bytes", "MB/s"))
+    for generator in cases:
+        for name, params, setup, function in generator:
+            if args.filter not in name:
+                continue
+            payload = setup()
+            seconds, blocks, peak = measure(function, min_time)
+            result = {
+                "name": name,
+                "params": params,
+                "ns_per_op": seconds * 1e9,
+                "allocated_blocks": blocks,
+                "peak_alloc_bytes": peak,
+                "payload_bytes": payload,
+                "mb_per_s": payload / seconds / 1e6,
+            }
+            results.append(result)
+            print("{:40} {:24} {:>14.0f} {:>8} {:>12} {:>10.1f}".format(
+                name, ",".join("{}={}".format(k, p) for k, p in params.items()),
+                result["ns_per_op"], blocks, peak, result["mb_per_s"]))
+
+    if args.json_path:
+        report = {
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "results": results,
+        }
+        with open(args.json_path, "w") as json_file:
+            json.dump(report, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
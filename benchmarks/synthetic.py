@@ -0,0 +1,127 @@
+"""
+Synthetic replacements for the C functions of the remote API library.
+They fill the output arguments from preallocated C buffers, so the
+marshalling code of pyrep.vrep.vrep runs without a simulator.
+"""
+import contextlib
+import ctypes as ct
+import importlib
+import io
+import sys
+
+
+def _load_binding():
+    """
+    Imports pyrep.vrep.vrep. Without the remoteApi library its prototypes
+    cannot be bound, so they are made while importing it as functions
+    failing when called, the ones used being replaced by synthetic ones.
+    """
+    try:
+        return importlib.import_module("pyrep.vrep.vrep")
+    except (AttributeError, OSError):
+        sys.modules.pop("pyrep.vrep.vrep", None)
+    cfunctype = ct.CFUNCTYPE
+
+    def unbound_cfunctype(restype, *argtypes):
+        def bind(name_and_library):
+            name = name_and_library[0]
+
+            def unavailable(*args):
+                raise RuntimeError("The remoteApi library is not loaded: " + name + " is not available")
+            return unavailable
+        return bind
+
+    ct.CFUNCTYPE = unbound_cfunctype
+    try:
+        # The missing library has already been reported by the first import
+        with contextlib.redirect_stdout(io.StringIO()):
+            return importlib.import_module("pyrep.vrep.vrep")
+    finally:
+        ct.CFUNCTYPE = cfunctype
+
+
+v = _load_binding()
+
+P = ct.POINTER
+
+_GetVisionSensorImage = ct.CFUNCTYPE(ct.c_int32, ct.c_int32, ct.c_int32, P(ct.c_int32), P(P(ct.c_byte)), ct.c_ubyte, ct.c_int32)
+_GetVisionSensorDepthBuffer = ct.CFUNCTYPE(ct.c_int32, ct.c_int32, ct.c_int32, P(ct.c_int32), P(P(ct.c_float)), ct.c_int32)
+_GetObjectGroupData = ct.CFUNCTYPE(ct.c_int32, ct.c_int32, ct.c_int32, ct.c_int32, P(ct.c_int32), P(P(ct.c_int32)), P(ct.c_int32), P(P(ct.c_int32)), P(ct.c_int32), P(P(ct.c_float)), P(ct.c_int32), P(P(ct.c_char)), ct.c_int32)
+_GetStringSignal = ct.CFUNCTYPE(ct.c_int32, ct.c_int32, P(ct.c_char), P(P(ct.c_ubyte)), P(ct.c_int32), ct.c_int32)
+
+# Keeps the callbacks and their buffers alive while installed
+_installed = {}
+
+
+def install_vision_sensor(width, height):
+    """
+    Serves an RGB image and a depth buffer of the given resolution.
+    @return bytes of one RGB frame
+    """
+    image = (ct.c_byte * (width * height * 3))(*[(i % 256) - 128 for i in range(width * height * 3)])
+    depth = (ct.c_float * (width * height))(*[i / (width * height) for i in range(width * height)])
+
+    def get_image(client_id, handle, resolution, c_image, options, op_mode):
+        resolution[0] = width
+        resolution[1] = height
+        c_image[0] = ct.cast(image, P(ct.c_byte))
+        return v.simx_return_ok
+
+    def get_depth_buffer(client_id, handle, resolution, c_buffer, op_mode):
+        resolution[0] = width
+        resolution[1] = height
+        c_buffer[0] = ct.cast(depth, P(ct.c_float))
+        return v.simx_return_ok
+
+    _install("c_GetVisionSensorImage", _GetVisionSensorImage(get_image), image)
+    _install("c_GetVisionSensorDepthBuffer", _GetVisionSensorDepthBuffer(get_depth_buffer), depth)
+    return len(image)
+
+
+def install_object_group_data(count, ints_per_object, floats_per_object, with_names):
+    """
+    Serves group data of count objects.
+    @return bytes of one reply
+    """
+    handles = (ct.c_int32 * count)(*range(count))
+    ints = (ct.c_int32 * (count * ints_per_object))()
+    floats = (ct.c_float * (count * floats_per_object))()
+    names = b"".join(("object_%d\0" % i).encode() for i in range(count)) if with_names else b""
+    strings = ct.create_string_buffer(names, len(names) + 1)
+
+    def get_group_data(client_id, object_type, data_type, handles_count, handles_pointer,
+                       ints_count, ints_pointer, floats_count, floats_pointer,
+                       strings_count, strings_pointer, op_mode):
+        handles_count[0] = count
+        handles_pointer[0] = ct.cast(handles, P(ct.c_int32))
+        ints_count[0] = len(ints)
+        ints_pointer[0] = ct.cast(ints, P(ct.c_int32))
+        floats_count[0] = len(floats)
+        floats_pointer[0] = ct.cast(floats, P(ct.c_float))
+        strings_count[0] = count if with_names else 0
+        strings_pointer[0] = ct.cast(strings, P(ct.c_char))
+        return v.simx_return_ok
+
+    _install("c_GetObjectGroupData", _GetObjectGroupData(get_group_data), (handles, ints, floats, strings))
+    return ct.sizeof(handles) + ct.sizeof(ints) + ct.sizeof(floats) + len(names)
+
+
+def install_string_signal(value: bytes):
+    """
+    Serves value as the content of every string signal.
+    @return bytes of the signal
+    """
+    buffer = (ct.c_ubyte * len(value)).from_buffer_copy(value)
+
+    def get_string_signal(client_id, signal_name, signal_value, signal_length, op_mode):
+        signal_value[0] = ct.cast(buffer, P(ct.c_ubyte))
+        signal_length[0] = len(value)
+        return v.simx_return_ok
+
+    _install("c_GetStringSignal", _GetStringSignal(get_string_signal), buffer)
+    return len(value)
+
+
+def _install(name, function, buffers):
+    _installed[name] = (function, buffers)
+    setattr(v, name, function)
@@ -15,8 +15,9 @@ class PioneerP3DX:
         self._right_sensor = api.sensor.vision("RightRGBSensor")  # type: VisionSensor
 
     def set_two_motor(self, left: float, right: float):
-        self._left_motor.set_target_velocity(left)
-        self._right_motor.set_target_velocity(right)
+        with self._api.batch():
+            self._left_motor.set_target_velocity(left)
+            self._right_motor.set_target_velocity(right)
 
     def rotate_right(self, speed=2.0):
         self.set_two_motor(speed, -speed)
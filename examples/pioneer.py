@@ -5,7 +5,7 @@ import numpy as np
 
 sys.path.append("..")
 from pyrep.api import VRepApi
-from pyrep.common import fix_angle_notation, Coordinates
+from pyrep.common import fix_angle_notation
 
 
 class RobotPosition:
@@ -36,14 +36,19 @@ class PioneerP3DX:
         self._ground_truth = api.sensor.ground_truth("Pioneer_p3dx")
         self._left_motor = api.joint.with_velocity_control("Pioneer_p3dx_leftMotor")
         self._right_motor = api.joint.with_velocity_control("Pioneer_p3dx_rightMotor")
-        self._sonars = []
-        for i in range(1, 17):
-            self._sonars.append(api.sensor.proximity("Pioneer_p3dx_ultrasonicSensor" + str(i)))
+        self._sonars = api.sensor.proximity_group(
+            ["Pioneer_p3dx_ultrasonicSensor" + str(i) for i in range(1, 17)])
+        # Streams, read from the input buffer once they have started
+        self._sonar_stream = api.subscribe(self._sonars.read)
+        self._position_stream = api.subscribe(self._ground_truth.get_position)
+        self._orientation_stream = api.subscribe(self._ground_truth.get_orientation)
+        if not api.streams.wait_ready(timeout=5.0):
+            raise Exception("Streaming has not begun")
         # Sonar values
         # -1 == no detection, or detection z coorditate
-        self.sonar_readings = np.full(self.num_sonars, -1.0, dtype=np.float)
+        self.sonar_readings = np.full(self.num_sonars, -1.0, dtype=float)
         # 0.0 == far, 1.0 == close
-        self.sonar_readings_normalized = np.zeros(self.num_sonars, dtype=np.float)
+        self.sonar_readings_normalized = np.zeros(self.num_sonars, dtype=float)
         # Ground truth position
         self.real_position = RobotPosition(0, 0, 0)
 
@@ -68,48 +73,32 @@ class PioneerP3DX:
         self._move(right_velocity, left_velocity)
 
     def _move(self, left: float, right: float):
-        self._left_motor.set_target_velocity(left)
-        self._right_motor.set_target_velocity(right)
-
-    # Get reading from one sonar
-    def _get_sonar_reading(self, sonar_number: int) -> Coordinates():
-        if not 0 <= sonar_number < self.num_sonars:
-            raise Exception("Sonar number does not exist (zero indexed): " + str(sonar_number))
-        state, coordinate = self._sonars[sonar_number].read()
-        # if streamming has not begun
-        while coordinate is None:
-            time.sleep(0.1)
-            state, coordinate = self._sonars[sonar_number].read()
-        if state == 0:
-            return -1.0
-        return coordinate.z
+        with self._api.batch():
+            self._left_motor.set_target_velocity(left)
+            self._right_motor.set_target_velocity(right)
+
+    # Get readings from all sonars
+    # -1 == no detection, or detection z coordinate
+    def _get_sonar_readings(self) -> np.ndarray:
+        states, points = self._sonar_stream.read()
+        return np.where(states, points[:, 2], -1.0)
 
     # Update the readings of all sonars
     # And update normalized readings
     def update_sonar_readings(self):
-        for i, _ in enumerate(self.sonar_readings):
-            reading = self._get_sonar_reading(i)
-            # If reading is invalid or farther than maximum distance
-            if reading == -1 or reading > self.sonar_detect_max_dist:
-                self.sonar_readings[i] = -1
-                self.sonar_readings_normalized[i] = 0.0
-            else:
-                # If reading is closer than minimum distance
-                if reading < self.sonar_detect_min_dist:
-                    reading = self.sonar_detect_min_dist
-                self.sonar_readings[i] = reading
-                self.sonar_readings_normalized[i] = 1 - (reading - self.sonar_detect_min_dist) / (self.sonar_detect_max_dist - self.sonar_detect_min_dist)
+        readings = self._get_sonar_readings()
+        # If reading is invalid or farther than maximum distance
+        invalid = (readings == -1) | (readings > self.sonar_detect_max_dist)
+        # If reading is closer than minimum distance
+        readings = np.maximum(readings, self.sonar_detect_min_dist)
+        normalized = 1 - (readings - self.sonar_detect_min_dist) / (self.sonar_detect_max_dist - self.sonar_detect_min_dist)
+        self.sonar_readings[:] = np.where(invalid, -1.0, readings)
+        self.sonar_readings_normalized[:] = np.where(invalid, 0.0, normalized)
 
     # Update robot position and orientation
     def update_real_position(self):
-        position = self._ground_truth.get_position()
-        orientation = self._ground_truth.get_orientation()
-        # if streamming has not begun
-        while(self._ground_truth.get_position() is None
-              or self._ground_truth.get_orientation() is None):
-            time.sleep(0.1)
-            position = self._ground_truth.get_position()
-            orientation = self._ground_truth.get_orientation()
+        position = self._position_stream.read()
+        orientation = self._orientation_stream.read()
         self.real_position = RobotPosition(position.x, position.y, fix_angle_notation(orientation.gamma))
 
 
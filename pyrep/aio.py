@@ -0,0 +1,224 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .api import VRepApi
+from .backend import Backend
+from .streams import Subscription, _has_value
+
+# asyncio.get_running_loop is new in Python 3.7, before which get_event_loop
+# returns the running loop when called from a coroutine
+_running_loop = getattr(asyncio, "get_running_loop", asyncio.get_event_loop)
+
+# Size of the executor shared by the connections created without an executor:
+# at most this many blocking calls (of different connections) run at once
+DEFAULT_THREADS = 4
+
+_shared_executor = None
+_shared_executor_lock = threading.Lock()
+
+
+def shared_executor() -> ThreadPoolExecutor:
+    """
+    Executor of the connections created without an executor, created on first use
+    with DEFAULT_THREADS threads whatever the number of connections.
+    """
+    global _shared_executor
+    with _shared_executor_lock:
+        if _shared_executor is None:
+            _shared_executor = ThreadPoolExecutor(max_workers=DEFAULT_THREADS)
+        return _shared_executor
+
+
+class AsyncVRepApi:
+
+    """
+    asyncio front end of a VRepApi.
+    All remote API calls of the connection run on an executor, one at a time and
+    in the order they are awaited, so blocking calls (e.g. simx_opmode_oneshot_wait)
+    do not block the event loop. By default all connections share the executor
+    returned by shared_executor(): many connections need no more threads, but a
+    blocking call holds one of the DEFAULT_THREADS threads while it waits for its
+    server, so more concurrent blocking calls than that queue up.
+    The simulation, joint, sensor and handles attributes mirror those of VRepApi,
+    with coroutine methods; the components they return are the synchronous ones.
+    """
+
+    def __init__(self, api: VRepApi, executor=None):
+        self.api = api
+        self._executor = executor if executor is not None else shared_executor()
+        # Created on first use, in the event loop running the calls
+        self._lock = None
+        self.simulation = _AsyncProxy(self, api.simulation)
+        self.joint = _AsyncProxy(self, api.joint)
+        self.sensor = _AsyncProxy(self, api.sensor)
+        self.handles = _AsyncProxy(self, api.handles)
+
+    @staticmethod
+    async def connect(ip, port, synchronous=False, backend: Backend=None, instrument=False, executor=None):
+        """
+        Connects to a V-REP server.
+        @see VRepApi.connect
+        @rtype AsyncVRepApi
+        """
+        if executor is None:
+            executor = shared_executor()
+        connect = functools.partial(VRepApi.connect, ip, port, synchronous, backend, instrument)
+        api = await _running_loop().run_in_executor(executor, connect)
+        return AsyncVRepApi(api, executor)
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Calls function on the executor of the connection,
+        after the calls of the connection awaited before.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        call = functools.partial(function, *args, **kwargs)
+        async with self._lock:
+            return await _running_loop().run_in_executor(self._executor, call)
+
+    async def close_connection(self):
+        await self.run(self.api.close_connection)
+
+    async def load_scene(self, path: str, client_side=False):
+        await self.run(self.api.load_scene, path, client_side)
+
+    async def subscribe(self, getter):
+        """
+        Streams the value of a getter.
+        @see VRepApi.subscribe
+        @rtype AsyncSubscription
+        """
+        subscription = await self.run(self.api.subscribe, getter)
+        return AsyncSubscription(self, subscription)
+
+    def batch(self):
+        """
+        Asynchronous context manager sending all commands awaited inside it in one packet.
+        @see Simulation.batch
+        """
+        return _AsyncBatch(self)
+
+    def stats(self, reset=False):
+        return self.api.stats(reset)
+
+    async def __aenter__(self):
+        await self.simulation.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        try:
+            await self.simulation.stop()
+        finally:
+            await self.close_connection()
+
+
+class AsyncSubscription:
+
+    """
+    Subscription whose reads are awaitable.
+    """
+
+    def __init__(self, api: AsyncVRepApi, subscription: Subscription):
+        self._api = api
+        self._subscription = subscription
+        self._last_time = None
+
+    @property
+    def active(self) -> bool:
+        return self._subscription.active
+
+    async def read(self):
+        """
+        Reads the last streamed value.
+        @see Subscription.read
+        """
+        return await self._api.run(self._subscription.read)
+
+    async def wait_ready(self, timeout=1.0) -> bool:
+        """
+        Waits until the first value has arrived, or timeout seconds.
+        @return whether a value is available
+        """
+        deadline = time.monotonic() + timeout
+        delay = 0.001
+        while not await self._api.run(self._subscription.is_ready):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.01)
+        return True
+
+    async def next(self, timeout=None):
+        """
+        Waits for a value received after the one returned by the previous call
+        (the first call returns as soon as there is a value).
+        Values are told apart by the simulation time of the last message
+        received from the server, so they only change while the simulation runs.
+        @raise asyncio.TimeoutError if nothing new arrives within timeout seconds
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = 0.001
+        while True:
+            value, message_time = await self._api.run(self._read_with_time)
+            if _has_value(value) and (self._last_time is None or message_time > self._last_time):
+                self._last_time = message_time
+                return value
+            if deadline is not None and time.monotonic() >= deadline:
+                raise asyncio.TimeoutError()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.01)
+
+    async def unsubscribe(self):
+        await self._api.run(self._subscription.unsubscribe)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.unsubscribe()
+
+    def _read_with_time(self):
+        value = self._subscription.read()
+        # Read after the value: a message arriving in between delays the value by a message at worst
+        return value, self._api.api.simulation.last_cmd_time()
+
+
+class _AsyncBatch:
+
+    def __init__(self, api: AsyncVRepApi):
+        self._api = api
+        self._batch = api.api.batch()
+
+    async def __aenter__(self):
+        await self._api.run(self._batch.__enter__)
+        return self._api
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self._api.run(self._batch.__exit__, exc_type, exc_val, exc_tb)
+
+
+class _AsyncProxy:
+
+    """
+    Runs the methods of an object on the executor of a connection.
+    """
+
+    def __init__(self, api: AsyncVRepApi, target):
+        self._api = api
+        self._target = target
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+
+        async def call(*args, **kwargs):
+            return await self._api.run(attribute, *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = attribute.__doc__
+        return call
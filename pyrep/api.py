@@ -1,18 +1,48 @@
-from .vrep import vrep as v
+from .vrep import vrepConst as vc
+from .backend import Backend, default_backend
+from .common import ReturnCommandError
+from .handles import HandleRegistry
 from .joints import Joints
 from .sensors import Sensors
 from .simulation import Simulation
+from .recorder import RecordingBackend, StreamRecorder
+from .stats import InstrumentedBackend
+from .streams import StreamRegistry
 
 class VRepApi:
-    def __init__(self, client_id):
+    def __init__(self, client_id, backend: Backend=None, instrument=False, recorder: StreamRecorder=None):
+        if backend is None:
+            backend = default_backend()
+        if instrument and not isinstance(backend, InstrumentedBackend):
+            backend = InstrumentedBackend(backend)
+        self._call_stats = backend.stats if isinstance(backend, InstrumentedBackend) else None
+        if recorder is not None:
+            backend = RecordingBackend(backend, recorder)
+        self.recorder = recorder
+        self._backend = backend
         self._id = client_id
-        self.joint = Joints(client_id)
-        self.sensor = Sensors(client_id)
-        self.simulation = Simulation(client_id)
+        self.handles = HandleRegistry(backend, client_id)
+        self.simulation = Simulation(backend, client_id)
+        self.joint = Joints(backend, client_id, self.handles, self.simulation)
+        self.sensor = Sensors(backend, client_id, self.handles)
+        self.streams = StreamRegistry()
 
     @staticmethod
-    def connect(ip, port):
-        client_id = v.simxStart(
+    def connect(ip, port, synchronous=False, backend: Backend=None, instrument=False,
+                recorder: StreamRecorder=None):
+        """
+        Connects to a V-REP server.
+        The remote API library is used unless another backend is given
+        (@see default_backend).
+        If instrument is set, the remote API calls are recorded (@see stats).
+        If a recorder is given, the readings received are logged to it,
+        and it is closed with the connection.
+        """
+        if backend is None:
+            backend = default_backend()
+        if instrument:
+            backend = InstrumentedBackend(backend)
+        client_id = backend.simxStart(
             connectionAddress=ip,
             connectionPort=port,
             waitUntilConnected=True,
@@ -22,10 +52,56 @@ class VRepApi:
         if client_id == -1:
             raise Exception("Could not connect")
         else:
-            return VRepApi(client_id)
+            api = VRepApi(client_id, backend, recorder=recorder)
+            if synchronous:
+                api.simulation.set_synchronous(True)
+            return api
 
     def close_connection(self):
-        v.simxFinish(self._id)
+        self.streams.unsubscribe_all()
+        self._backend.simxFinish(self._id)
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def load_scene(self, path: str, client_side=False):
+        """
+        Loads a scene, replacing the current one.
+        Handles and joint properties cached for the previous scene are dropped,
+        and fetched again when next needed.
+        """
+        code = self._backend.simxLoadScene(self._id, path, int(client_side), vc.simx_opmode_oneshot_wait)
+        self.handles.invalidate()
+        self.joint.invalidate()
+        if code != vc.simx_return_ok:
+            raise ReturnCommandError(code)
+
+    def subscribe(self, getter):
+        """
+        Streams the value of a getter, e.g. api.subscribe(sensor.read).
+        @see StreamRegistry.subscribe
+        @rtype Subscription
+        """
+        return self.streams.subscribe(getter)
+
+    def stats(self, reset=False):
+        """
+        Statistics of the remote API calls made so far (@see CallStats.snapshot),
+        None if the connection is not instrumented.
+        If reset is set, the statistics start again from zero.
+        """
+        if self._call_stats is None:
+            return None
+        snapshot = self._call_stats.snapshot()
+        if reset:
+            self._call_stats.reset()
+        return snapshot
+
+    def batch(self):
+        """
+        Context manager sending all commands issued inside it in one packet.
+        @see Simulation.batch
+        """
+        return self.simulation.batch()
 
     def __enter__(self):
         self.simulation.start()
@@ -0,0 +1,91 @@
+import os
+
+
+class Backend:
+
+    """
+    Interface between pyrep and the V-REP remote API.
+    A backend provides the functions listed in FUNCTIONS, with the arguments,
+    return values and return codes of the functions of the same name
+    in pyrep.vrep.vrep.
+    """
+
+    FUNCTIONS = (
+        # Connection
+        "simxStart",
+        "simxFinish",
+        "simxGetPingTime",
+        "simxGetLastCmdTime",
+        "simxGetInMessageInfo",
+        "simxPauseCommunication",
+        # Simulation
+        "simxLoadScene",
+        "simxStartSimulation",
+        "simxPauseSimulation",
+        "simxStopSimulation",
+        "simxSynchronous",
+        "simxSynchronousTrigger",
+        "simxGetFloatSignal",
+        "simxGetStringSignal",
+        # Objects
+        "simxGetObjectHandle",
+        "simxGetObjectGroupData",
+        "simxGetObjectFloatParameter",
+        "simxGetObjectPosition",
+        "simxGetObjectOrientation",
+        "simxGetObjectQuaternion",
+        "simxGetObjectVelocity",
+        # Joints
+        "simxGetJointForce",
+        "simxGetJointMatrix",
+        "simxGetJointPosition",
+        "simxSetJointForce",
+        "simxSetJointPosition",
+        "simxSetJointTargetPosition",
+        "simxSetJointTargetVelocity",
+        "simxSetSphericalJointMatrix",
+        # Sensors
+        "simxReadProximitySensor",
+        "simxReadForceSensor",
+        "simxReadVisionSensor",
+        "simxGetVisionSensorImageNumpy",
+        "simxGetVisionSensorDepthBufferNumpy",
+    )
+
+    def __getattr__(self, name):
+        # Only called for functions the backend does not define
+        if name in Backend.FUNCTIONS:
+            raise NotImplementedError(type(self).__name__ + " does not implement " + name)
+        raise AttributeError(name)
+
+
+class CtypesBackend(Backend):
+
+    """
+    Backend calling the remote API library (remoteApi) through
+    the ctypes bindings of pyrep.vrep.vrep.
+    The library is only loaded when the backend is created.
+    """
+
+    def __init__(self):
+        from .vrep import vrep
+        for name in self.FUNCTIONS:
+            setattr(self, name, getattr(vrep, name))
+
+
+def default_backend() -> Backend:
+    """
+    Backend used when none is given: a FakeBackend serving the scene
+    description file named by the PYREP_FAKE_SCENE environment variable
+    if it is set, a ReplayBackend serving the log directory named by
+    PYREP_REPLAY_LOG if it is set, a CtypesBackend otherwise.
+    """
+    scene = os.environ.get("PYREP_FAKE_SCENE")
+    if scene:
+        from .fake import FakeBackend
+        return FakeBackend(scene)
+    log = os.environ.get("PYREP_REPLAY_LOG")
+    if log:
+        from .replay import ReplayBackend
+        return ReplayBackend(log)
+    return CtypesBackend()
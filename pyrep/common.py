@@ -1,6 +1,6 @@
 import math
 import numpy as np
-from .vrep import vrep as v
+from .vrep import vrepConst as vc
 
 class Coordinates:
 
@@ -39,15 +39,38 @@ class EulerAngles:
 # vrep angle: 0 -> 180 -> -180 -> 0
 # fixed angle: 0 -> 360
 def fix_angle_notation(angle):
-    neg = False
-    if angle < 0:
-        neg = True
-        angle = -angle
-    while angle > np.deg2rad(180):
-        angle -= np.deg2rad(180)
-    if neg:
-        angle = np.deg2rad(360) - angle
-    return angle
+    return wrap_angle_positive(angle)
+
+
+def wrap_angle_positive(angles):
+    """
+    Wraps angles (a scalar or an array of any shape) to [0, 2pi).
+    """
+    wrapped = np.mod(angles, 2 * np.pi)
+    # np.mod of tiny negative angles rounds to 2pi
+    return np.where(wrapped >= 2 * np.pi, 0.0, wrapped)[()]
+
+
+def wrap_angle(angles):
+    """
+    Wraps angles (a scalar or an array of any shape) to [-pi, pi), the V-REP notation.
+    """
+    return wrap_angle_positive(np.add(angles, np.pi)) - np.pi
+
+
+def unwrap_angles(angles, axis=-1):
+    """
+    Removes the 2pi jumps of a sequence of angles along axis, e.g. of the heading of a trajectory,
+    so that it is continuous: consecutive angles differ by less than pi.
+    """
+    return np.unwrap(angles, axis=axis)
+
+
+def angle_difference(a, b):
+    """
+    Signed smallest rotation from b to a, in [-pi, pi), element-wise.
+    """
+    return wrap_angle(np.subtract(a, b))
 
 
 class NotFoundComponentError(Exception):
@@ -67,21 +90,21 @@ class ReturnCommandError(Exception):
 
     def __init__(self, code):
         msg = ""
-        if code == v.simx_return_novalue_flag:
+        if code == vc.simx_return_novalue_flag:
             msg = "There is no command reply in the input buffer. This should not always be considered as an error, depending on the selected operation mode"
-        elif code == v.simx_return_timeout_flag:
+        elif code == vc.simx_return_timeout_flag:
             msg = "The function timed out (probably the network is down or too slow)"
-        elif code == v.simx_return_illegal_opmode_flag:
+        elif code == vc.simx_return_illegal_opmode_flag:
             msg = "The specified operation mode is not supported for the given function"
-        elif code == v.simx_return_remote_error_flag:
+        elif code == vc.simx_return_remote_error_flag:
             msg = "The function caused an error on the server side (e.g. an invalid handle was specified)"
-        elif code == v.simx_return_split_progress_flag:
+        elif code == vc.simx_return_split_progress_flag:
             msg = "The communication thread is still processing previous split command of the same type"
-        elif code == v.simx_return_local_error_flag:
+        elif code == vc.simx_return_local_error_flag:
             msg = "The function caused an error on the client side"
-        elif code == v.simx_return_initialize_error_flag:
+        elif code == vc.simx_return_initialize_error_flag:
             msg = "simxStart was not yet called"
-        elif code == v.simx_return_ok:
+        elif code == vc.simx_return_ok:
             msg = "The function executed fine, why is this an exception?"
         else:
             msg = "Undefined return code: " + str(code)
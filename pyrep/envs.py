@@ -0,0 +1,200 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .api import VRepApi
+
+
+class VecEnv:
+
+    """
+    Gym-style vectorized environment stepping K simulations in lock-step
+    (synchronous mode), one VRepApi per simulation.
+    Actions are (K, J) arrays of joint targets, observations dicts of (K, ...) arrays:
+        * "joint_positions": (K, J) positions of the action joints
+        * "proximity": (K, S) distances detected by the proximity sensors, inf without detection
+        * "object_positions": (K, O, 3) absolute positions of the objects
+    The simulations are commanded and stepped concurrently (one thread each),
+    so their round-trips overlap.
+    """
+
+    def __init__(self, apis, joints, control="velocity", proximity_sensors=(), objects=(),
+                 reward=None, done=None, max_steps=None, steps_per_action=1):
+        """
+        @param apis connections to the K simulations, with the same scene
+        @param joints names of the joints commanded by the actions
+        @param control "velocity" or "position": the joint targets set by the actions
+        @param reward function (observations, actions) -> (K,) rewards, zeros if None
+        @param done function (observations) -> (K,) bools, ending an episode of a simulation
+        @param max_steps steps after which an episode ends, unlimited if None
+        """
+        if control not in ("velocity", "position"):
+            raise ValueError("Unknown control: " + str(control))
+        self._apis = list(apis)
+        self._joint_names = list(joints)
+        self._control = control
+        self._reward = reward
+        self._done = done
+        self._max_steps = max_steps
+        self._steps_per_action = steps_per_action
+        self._owns_apis = False
+        self._executor = ThreadPoolExecutor(max_workers=len(self._apis))
+        self._joints = [None] * len(self._apis)
+        self._streams = [None] * len(self._apis)
+        self._map(lambda index: self._set_up(index, list(proximity_sensors), list(objects)), range(len(self._apis)))
+        self._episode_steps = np.zeros(len(self._apis), dtype=np.int64)
+
+    @staticmethod
+    def connect(endpoints, joints, backend_factory=None, **kwargs):
+        """
+        Connects to the servers at endpoints, (ip, port) pairs, and makes an
+        environment of them; closing it closes the connections.
+        @param backend_factory function returning the Backend of a connection,
+        the default backend is used if None
+        @rtype VecEnv
+        """
+        apis = []
+        try:
+            for ip, port in endpoints:
+                backend = backend_factory() if backend_factory is not None else None
+                apis.append(VRepApi.connect(ip, port, synchronous=True, backend=backend))
+            env = VecEnv(apis, joints, **kwargs)
+        except BaseException:
+            for api in apis:
+                api.close_connection()
+            raise
+        env._owns_apis = True
+        return env
+
+    @property
+    def num_envs(self) -> int:
+        return len(self._apis)
+
+    @property
+    def num_actions(self) -> int:
+        return len(self._joint_names)
+
+    def reset(self) -> dict:
+        """
+        Restarts all simulations.
+        @return first observations
+        """
+        self._map(self._restart, range(len(self._apis)))
+        self._episode_steps[:] = 0
+        return self._observe()
+
+    def step(self, actions):
+        """
+        Applies the actions and advances all simulations by steps_per_action steps.
+        Simulations whose episode has ended are restarted: their observation is the
+        first one of the next episode, the last one is in info["terminal_observation"].
+        @return observations, rewards (K,), dones (K,) and an info dict per simulation
+        """
+        actions = np.asarray(actions, dtype=np.float64).reshape(len(self._apis), len(self._joint_names))
+        self._map(self._act, range(len(self._apis)), actions)
+        observations = self._observe()
+        self._episode_steps += 1
+        if self._reward is not None:
+            rewards = np.array(self._reward(observations, actions), dtype=np.float32)
+        else:
+            rewards = np.zeros(len(self._apis), dtype=np.float32)
+        if self._done is not None:
+            dones = np.array(self._done(observations), dtype=bool)
+        else:
+            dones = np.zeros(len(self._apis), dtype=bool)
+        if self._max_steps is not None:
+            dones |= self._episode_steps >= self._max_steps
+        infos = [{} for _ in self._apis]
+        finished = np.flatnonzero(dones)
+        if len(finished):
+            for index in finished:
+                infos[index]["terminal_observation"] = {key: value[index].copy()
+                                                        for key, value in observations.items()}
+            self._map(self._restart, finished)
+            self._episode_steps[finished] = 0
+            first = self._map(self._observe_one, finished)
+            for index, observation in zip(finished, first):
+                for key, value in observation.items():
+                    observations[key][index] = value
+        return observations, rewards, dones, infos
+
+    def close(self):
+        """
+        Stops the simulations, and closes the connections made by connect.
+        """
+        try:
+            self._map(self._tear_down, range(len(self._apis)))
+        finally:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _map(self, function, *iterables):
+        return list(self._executor.map(function, *iterables))
+
+    def _set_up(self, index, proximity_sensors, objects):
+        api = self._apis[index]
+        api.simulation.set_synchronous(True)
+        joints = api.joint.group(self._joint_names)
+        sensors = api.sensor.proximity_group(proximity_sensors) if proximity_sensors else None
+        ground_truths = [api.sensor.ground_truth(name) for name in objects]
+        self._joints[index] = joints
+        self._streams[index] = (
+            api.subscribe(joints.get_positions),
+            api.subscribe(sensors.read) if sensors is not None else None,
+            [api.subscribe(ground_truth.get_position) for ground_truth in ground_truths])
+
+    def _restart(self, index, timeout=5.0):
+        api = self._apis[index]
+        deadline = time.monotonic() + timeout
+        api.simulation.stop()
+        # A start sent while the simulation is stopping would be ignored
+        api.simulation.wait_stopped(timeout)
+        stopped_time = api.simulation.last_cmd_time()
+        api.simulation.start()
+        api.streams.reset_ready()
+        # One step, so the streams have a value of the new episode
+        api.simulation.step()
+        # The input buffer holds the values of the previous episode until a message of the new one is received
+        while api.simulation.last_cmd_time() <= stopped_time:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Simulation " + str(index) + " has not restarted")
+            time.sleep(0.001)
+        if not api.streams.wait_ready(timeout=max(deadline - time.monotonic(), 0)):
+            raise RuntimeError("Streaming has not begun for simulation " + str(index))
+
+    def _act(self, index, action):
+        joints = self._joints[index]
+        if self._control == "velocity":
+            joints.set_target_velocities(action)
+        else:
+            joints.set_target_positions(action)
+        self._apis[index].simulation.step(self._steps_per_action)
+
+    def _observe(self) -> dict:
+        observations = self._map(self._observe_one, range(len(self._apis)))
+        return {key: np.stack([observation[key] for observation in observations])
+                for key in observations[0]}
+
+    def _observe_one(self, index) -> dict:
+        joint_stream, sensor_stream, object_streams = self._streams[index]
+        observation = {"joint_positions": joint_stream.read()}
+        if sensor_stream is not None:
+            states, points = sensor_stream.read()
+            observation["proximity"] = np.where(states, np.linalg.norm(points, axis=1), np.inf).astype(np.float32)
+        if object_streams:
+            positions = [stream.read() for stream in object_streams]
+            observation["object_positions"] = np.array(
+                [[position.x, position.y, position.z] for position in positions], dtype=np.float32)
+        return observation
+
+    def _tear_down(self, index):
+        api = self._apis[index]
+        api.streams.unsubscribe_all()
+        api.simulation.stop()
+        api.simulation.set_synchronous(False)
+        if self._owns_apis:
+            api.close_connection()
@@ -0,0 +1,688 @@
+import json
+import time
+import numpy as np
+from .vrep import vrepConst as vc
+from .backend import Backend
+from . import transforms
+
+
+def _rotation(euler) -> np.ndarray:
+    """
+    Rotation matrix of V-REP Euler angles: Rx(alpha) * Ry(beta) * Rz(gamma).
+    """
+    return transforms.euler_to_matrix(euler)
+
+
+def _euler(rotation) -> list:
+    return transforms.matrix_to_euler(rotation).tolist()
+
+
+class _FakeObject:
+
+    TYPE = vc.sim_object_dummy_type
+
+    def __init__(self, handle, description):
+        self.handle = handle
+        self.name = description["name"]
+        self.parent = None
+        self.position = np.array(description.get("position", [0, 0, 0]), dtype=np.float64)
+        self.rotation = _rotation(description.get("orientation", [0, 0, 0]))
+        self.linear_velocity = np.zeros(3)
+        self.angular_velocity = np.zeros(3)
+
+    def world_pose(self):
+        if self.parent is None:
+            return self.rotation, self.position
+        parent_rotation, parent_position = self.parent.world_pose()
+        return parent_rotation.dot(self.rotation), parent_rotation.dot(self.position) + parent_position
+
+
+class _FakeShape(_FakeObject):
+
+    """
+    Shape with an optional "primitive" ("box" with a "size", or "sphere" with a "radius")
+    detected by proximity sensors.
+    """
+
+    TYPE = vc.sim_object_shape_type
+
+    def __init__(self, handle, description):
+        super(_FakeShape, self).__init__(handle, description)
+        self.primitive = description.get("primitive")
+        self.half_size = np.array(description.get("size", [0, 0, 0]), dtype=np.float64) / 2
+        self.radius = description.get("radius", 0.0)
+
+    def intersect(self, origin, direction):
+        """
+        @return distance along the ray and world normal of the closest hit, or None
+        """
+        rotation, position = self.world_pose()
+        if self.primitive == "sphere":
+            offset = origin - position
+            b = offset.dot(direction)
+            disc = b * b - offset.dot(offset) + self.radius ** 2
+            if disc < 0:
+                return None
+            distance = -b - np.sqrt(disc)
+            if distance < 0:
+                distance = -b + np.sqrt(disc)
+            if distance < 0:
+                return None
+            return distance, (origin + distance * direction - position) / self.radius
+        if self.primitive == "box":
+            local_origin = rotation.T.dot(origin - position)
+            local_direction = rotation.T.dot(direction)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t1 = (-self.half_size - local_origin) / local_direction
+                t2 = (self.half_size - local_origin) / local_direction
+            near = np.nan_to_num(np.minimum(t1, t2), nan=-np.inf)
+            far = np.nan_to_num(np.maximum(t1, t2), nan=np.inf)
+            t_near, t_far = near.max(), far.min()
+            if t_far < max(t_near, 0):
+                return None
+            if t_near >= 0:
+                axis = near.argmax()
+                normal = np.zeros(3)
+                normal[axis] = -np.sign(local_direction[axis])
+                return t_near, rotation.dot(normal)
+            return t_far, -direction
+        return None
+
+
+class _FakeJoint(_FakeObject):
+
+    """
+    Joint following its target velocity or target position (at up to "max_velocity").
+    Joints do not move their children.
+    """
+
+    TYPE = vc.sim_object_joint_type
+    JOINT_TYPES = {
+        "revolute": vc.sim_joint_revolute_subtype,
+        "prismatic": vc.sim_joint_prismatic_subtype,
+        "spherical": vc.sim_joint_spherical_subtype,
+    }
+    JOINT_MODES = {
+        "passive": vc.sim_jointmode_passive,
+        "force": vc.sim_jointmode_force,
+    }
+
+    def __init__(self, handle, description):
+        super(_FakeJoint, self).__init__(handle, description)
+        self.joint_type = self.JOINT_TYPES[description.get("joint_type", "revolute")]
+        self.mode = self.JOINT_MODES[description.get("mode", "force")]
+        self.low_limit = description.get("low_limit", 0.0)
+        self.range = description.get("range", -1.0)
+        self.max_velocity = description.get("max_velocity", np.pi)
+        self.joint_position = description.get("joint_position", 0.0)
+        self.joint_velocity = 0.0
+        self.force = 0.0
+        self.max_force = description.get("max_force", 10.0)
+        self.matrix = [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0]
+        self.target_velocity = 0.0
+        self.target_position = None
+
+    def step(self, dt):
+        if self.mode == vc.sim_jointmode_passive:
+            self.joint_velocity = 0.0
+            return
+        if self.target_position is not None:
+            delta = self.target_position - self.joint_position
+            max_delta = self.max_velocity * dt
+            self.joint_velocity = float(np.clip(delta, -max_delta, max_delta)) / dt
+        else:
+            self.joint_velocity = self.target_velocity
+        self.joint_position += self.joint_velocity * dt
+
+
+class _FakeProximitySensor(_FakeObject):
+
+    """
+    Proximity sensor detecting shapes along its z axis, up to "range".
+    """
+
+    TYPE = vc.sim_object_proximitysensor_type
+
+    def __init__(self, handle, description):
+        super(_FakeProximitySensor, self).__init__(handle, description)
+        self.range = description.get("range", 1.0)
+
+    def detect(self, shapes):
+        """
+        @return detection state, point and normal in the sensor frame and detected object handle
+        """
+        rotation, position = self.world_pose()
+        direction = rotation[:, 2]
+        closest = None
+        for shape in shapes:
+            hit = shape.intersect(position, direction)
+            if hit is not None and hit[0] <= self.range and (closest is None or hit[0] < closest[0]):
+                closest = hit + (shape.handle,)
+        if closest is None:
+            return False, [0.0, 0.0, 0.0], [0.0, 0.0, 0.0], -1
+        distance, normal, handle = closest
+        return True, [0.0, 0.0, float(distance)], rotation.T.dot(normal).tolist(), handle
+
+
+class _FakeVisionSensor(_FakeObject):
+
+    """
+    Vision sensor producing a synthetic pattern scrolling with simulation time.
+    """
+
+    TYPE = vc.sim_object_visionsensor_type
+
+    def __init__(self, handle, description):
+        super(_FakeVisionSensor, self).__init__(handle, description)
+        self.resolution = description.get("resolution", [64, 64])
+        self.near_clipping = description.get("near_clipping", 0.01)
+        self.far_clipping = description.get("far_clipping", 10.0)
+
+    def image(self, sim_time, grey_scale):
+        width, height = self.resolution
+        shift = int(sim_time * 50)
+        pattern = (np.arange(width)[np.newaxis, :] + 2 * np.arange(height)[:, np.newaxis] + shift) % 256
+        pattern = pattern.astype(np.uint8)
+        if grey_scale:
+            return pattern.ravel()
+        return np.stack([pattern, pattern[::-1], 255 - pattern], axis=-1).ravel()
+
+    def depth_buffer(self):
+        width, height = self.resolution
+        rows = np.linspace(0.0, 1.0, height, dtype=np.float32)
+        return np.repeat(rows, width)
+
+
+class _FakeForceSensor(_FakeObject):
+
+    TYPE = vc.sim_object_forcesensor_type
+
+
+class _DifferentialDrive:
+
+    """
+    Moves a body in its xy plane from the velocities of its two wheel joints.
+    """
+
+    def __init__(self, body, left, right, wheel_radius, wheels_distance):
+        self.body = body
+        self.left = left
+        self.right = right
+        self.wheel_radius = wheel_radius
+        self.wheels_distance = wheels_distance
+
+    def step(self, dt):
+        left = self.left.joint_velocity * self.wheel_radius
+        right = self.right.joint_velocity * self.wheel_radius
+        linear = (left + right) / 2
+        angular = (right - left) / self.wheels_distance
+        self.body.position = self.body.position + self.body.rotation[:, 0] * linear * dt
+        self.body.rotation = self.body.rotation.dot(_rotation([0, 0, angular * dt]))
+
+
+class FakeBackend(Backend):
+
+    """
+    In-process stand-in for a V-REP server, for running pyrep without V-REP.
+
+    The scene is a dict, or the path of a JSON file, with the keys:
+        * "time_step": simulation time step in seconds (default 0.05)
+        * "objects": list of objects with a "name", a "type" (dummy, shape, joint,
+          proximity_sensor, vision_sensor or force_sensor), an optional "parent" name,
+          "position" and "orientation" (Euler angles) relative to the parent,
+          and the parameters of the classes of this module for their type.
+          A body may have a "drive" with "left" and "right" joint names,
+          "wheel_radius" and "wheels_distance" to move as a differential drive robot.
+    Once started, the simulation follows the wall clock (scaled by time_scale),
+    or advances one step per trigger in synchronous mode.
+    As with V-REP, stopping the simulation takes stop_passes time steps (of wall
+    clock time), during which the simulation is still reported as running
+    and starting it is ignored.
+    Blocking calls sleep for latency seconds. As with the remote API, streamed
+    values are only available a communication cycle and the latency after
+    the call starting the stream.
+    """
+
+    _OBJECT_CLASSES = {
+        "dummy": _FakeObject,
+        "shape": _FakeShape,
+        "joint": _FakeJoint,
+        "proximity_sensor": _FakeProximitySensor,
+        "vision_sensor": _FakeVisionSensor,
+        "force_sensor": _FakeForceSensor,
+    }
+
+    def __init__(self, scene=None, latency=0.0, time_scale=1.0, stop_passes=3):
+        self.latency = latency
+        self.time_scale = time_scale
+        self.stop_passes = stop_passes
+        self._next_client_id = 0
+        self._wall_time = time.monotonic()
+        self._running = False
+        self._paused = False
+        self._stopped_at = None
+        self._synchronous = False
+        self._communication_paused = False
+        self._pending = []
+        self._streams = {}
+        self._cycle = 0.005
+        self._float_signals = {}
+        self._string_signals = {}
+        self._description = {"objects": []}
+        if scene is not None:
+            self.load(scene)
+        else:
+            self._build()
+
+    def load(self, scene):
+        """
+        Replaces the scene by a scene description (dict or path of a JSON file).
+        """
+        if not isinstance(scene, dict):
+            with open(scene) as scene_file:
+                scene = json.load(scene_file)
+        self._description = scene
+        self._build()
+
+    def _build(self):
+        self._time_step = self._description.get("time_step", 0.05)
+        self._time = 0.0
+        self._elapsed = 0.0
+        self._objects = {}
+        self._handles = {}
+        for handle, description in enumerate(self._description.get("objects", []), 1):
+            obj = self._OBJECT_CLASSES[description.get("type", "dummy")](handle, description)
+            self._objects[handle] = obj
+            self._handles[obj.name] = handle
+        self._drives = []
+        for description in self._description.get("objects", []):
+            obj = self._objects[self._handles[description["name"]]]
+            if description.get("parent") is not None:
+                obj.parent = self._objects[self._handles[description["parent"]]]
+            drive = description.get("drive")
+            if drive is not None:
+                self._drives.append(_DifferentialDrive(
+                    obj, self._objects[self._handles[drive["left"]]],
+                    self._objects[self._handles[drive["right"]]],
+                    drive["wheel_radius"], drive["wheels_distance"]))
+        self._joints = self._of_type(_FakeJoint)
+        self._shapes = [shape for shape in self._of_type(_FakeShape) if shape.primitive]
+
+    def _of_type(self, cls):
+        return [obj for obj in self._objects.values() if isinstance(obj, cls)]
+
+    # Simulation time
+
+    def _advance(self):
+        now = time.monotonic()
+        if self._stopped_at is not None:
+            if now < self._stopped_at:
+                self._wall_time = now
+                return
+            # The scene is restored as it was before the simulation started
+            self._running = False
+            self._paused = False
+            self._stopped_at = None
+            self._build()
+        if self._running and not self._paused and not self._synchronous:
+            self._elapsed += (now - self._wall_time) * self.time_scale
+            while self._elapsed >= self._time_step:
+                self._elapsed -= self._time_step
+                self._step()
+        self._wall_time = now
+
+    def _step(self):
+        dt = self._time_step
+        previous = {handle: obj.world_pose() for handle, obj in self._objects.items()}
+        for joint in self._joints:
+            joint.step(dt)
+        for drive in self._drives:
+            drive.step(dt)
+        for handle, obj in self._objects.items():
+            old_rotation, old_position = previous[handle]
+            rotation, position = obj.world_pose()
+            obj.linear_velocity = (position - old_position) / dt
+            delta = rotation.dot(old_rotation.T)
+            obj.angular_velocity = np.array([
+                delta[2, 1] - delta[1, 2],
+                delta[0, 2] - delta[2, 0],
+                delta[1, 0] - delta[0, 1]]) / (2 * dt)
+        self._time += dt
+
+    # Emulation of the remote API
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _reply(self, key, op_mode):
+        """
+        Whether a getter replies with a value, following its operation mode.
+        """
+        self._advance()
+        mode = op_mode & 0xff0000
+        if mode in (vc.simx_opmode_discontinue, vc.simx_opmode_remove):
+            self._streams.pop(key, None)
+            return False
+        if mode == vc.simx_opmode_oneshot_wait:
+            self._wait()
+            self._advance()
+            return True
+        if key in self._streams:
+            return time.monotonic() >= self._streams[key]
+        if mode != vc.simx_opmode_buffer:
+            # The first reply arrives after a communication cycle and the network latency
+            self._streams[key] = time.monotonic() + self._cycle + self.latency
+        return False
+
+    def _command(self, op_mode, apply):
+        self._advance()
+        if op_mode & 0xff0000 == vc.simx_opmode_oneshot_wait:
+            self._wait()
+        if self._communication_paused:
+            self._pending.append(apply)
+        else:
+            apply()
+        return vc.simx_return_ok
+
+    def _object(self, handle, cls=_FakeObject):
+        obj = self._objects.get(handle)
+        if isinstance(obj, cls):
+            return obj
+        return None
+
+    def _relative_pose(self, obj, relative_to):
+        rotation, position = obj.world_pose()
+        if relative_to == vc.sim_handle_parent:
+            reference = obj.parent
+        else:
+            reference = self._object(relative_to)
+        if reference is None:
+            return rotation, position
+        reference_rotation, reference_position = reference.world_pose()
+        return reference_rotation.T.dot(rotation), reference_rotation.T.dot(position - reference_position)
+
+    # Connection
+
+    def simxStart(self, connectionAddress, connectionPort, waitUntilConnected,
+                  doNotReconnectOnceDisconnected, timeOutInMs, commThreadCycleInMs):
+        self._wait()
+        self._wall_time = time.monotonic()
+        self._cycle = commThreadCycleInMs / 1000.0
+        client_id = self._next_client_id
+        self._next_client_id += 1
+        return client_id
+
+    def simxFinish(self, clientID):
+        pass
+
+    def simxGetPingTime(self, clientID):
+        self._advance()
+        self._wait()
+        return vc.simx_return_ok, int(self.latency * 1000)
+
+    def simxGetLastCmdTime(self, clientID):
+        self._advance()
+        return int(self._time * 1000)
+
+    def simxGetInMessageInfo(self, clientID, infoType):
+        self._advance()
+        if infoType != vc.simx_headeroffset_server_state:
+            return -1, 0
+        return 1, int(self._running) | int(self._paused) << 1
+
+    def simxPauseCommunication(self, clientID, enable):
+        self._communication_paused = bool(enable)
+        if not enable:
+            pending, self._pending = self._pending, []
+            for apply in pending:
+                apply()
+        return vc.simx_return_ok
+
+    # Simulation
+
+    def simxLoadScene(self, clientID, scenePathAndName, options, operationMode):
+        self._wait()
+        try:
+            self.load(scenePathAndName)
+        except (OSError, ValueError, KeyError):
+            return vc.simx_return_remote_error_flag
+        self._running = False
+        self._stopped_at = None
+        self._streams.clear()
+        return vc.simx_return_ok
+
+    def simxStartSimulation(self, clientID, operationMode):
+        self._advance()
+        self._wait()
+        if self._stopped_at is None:
+            self._running = True
+            self._paused = False
+        return vc.simx_return_ok
+
+    def simxPauseSimulation(self, clientID, operationMode):
+        self._advance()
+        self._wait()
+        self._paused = self._running
+        return vc.simx_return_ok
+
+    def simxStopSimulation(self, clientID, operationMode):
+        self._advance()
+        self._wait()
+        if self._running and self._stopped_at is None:
+            self._stopped_at = time.monotonic() + self.stop_passes * self._time_step / self.time_scale
+            self._advance()
+        return vc.simx_return_ok
+
+    def simxSynchronous(self, clientID, enable):
+        self._advance()
+        self._synchronous = bool(enable)
+        return vc.simx_return_ok
+
+    def simxSynchronousTrigger(self, clientID):
+        self._advance()
+        if self._running and not self._paused and self._synchronous and self._stopped_at is None:
+            self._step()
+        return vc.simx_return_ok
+
+    def simxSetFloatSignal(self, clientID, signalName, signalValue, operationMode):
+        return self._command(operationMode, lambda: self._float_signals.__setitem__(signalName, signalValue))
+
+    def simxGetFloatSignal(self, clientID, signalName, operationMode):
+        if not self._reply(("simxGetFloatSignal", signalName), operationMode) \
+                or signalName not in self._float_signals:
+            return vc.simx_return_novalue_flag, 0.0
+        return vc.simx_return_ok, self._float_signals[signalName]
+
+    def simxSetStringSignal(self, clientID, signalName, signalValue, operationMode):
+        if isinstance(signalValue, str):
+            signalValue = signalValue.encode('utf-8')
+        value = bytes(signalValue)
+        return self._command(operationMode, lambda: self._string_signals.__setitem__(signalName, value))
+
+    def simxGetStringSignal(self, clientID, signalName, operationMode, copy=True):
+        if not self._reply(("simxGetStringSignal", signalName), operationMode) \
+                or signalName not in self._string_signals:
+            return vc.simx_return_novalue_flag, bytearray()
+        value = self._string_signals[signalName]
+        if copy:
+            return vc.simx_return_ok, bytearray(value)
+        return vc.simx_return_ok, np.frombuffer(value, dtype=np.uint8)
+
+    # Objects
+
+    def simxGetObjectHandle(self, clientID, objectName, operationMode):
+        self._advance()
+        self._wait()
+        if objectName in self._handles:
+            return vc.simx_return_ok, self._handles[objectName]
+        return vc.simx_return_remote_error_flag, 0
+
+    def simxGetObjectGroupData(self, clientID, objectType, dataType, operationMode):
+        if not self._reply(("simxGetObjectGroupData", objectType, dataType), operationMode):
+            return vc.simx_return_novalue_flag, [], [], [], []
+        objects = [obj for obj in self._objects.values()
+                   if objectType in (vc.sim_appobj_object_type, obj.TYPE)]
+        handles = [obj.handle for obj in objects]
+        int_data, float_data, string_data = [], [], []
+        if dataType == 0:
+            string_data = [obj.name for obj in objects]
+        elif dataType == 9:
+            for obj in objects:
+                rotation, position = obj.world_pose()
+                float_data += position.tolist() + _euler(rotation)
+        elif dataType == 13 and objectType == vc.sim_object_proximitysensor_type:
+            for sensor in objects:
+                state, point, normal, detected = sensor.detect(self._shapes)
+                int_data += [int(state), detected]
+                float_data += point + normal
+        elif dataType == 16 and objectType == vc.sim_object_joint_type:
+            for joint in objects:
+                int_data += [joint.joint_type, joint.mode]
+                float_data += [joint.low_limit, joint.range]
+        else:
+            return vc.simx_return_remote_error_flag, [], [], [], []
+        return vc.simx_return_ok, handles, int_data, float_data, string_data
+
+    def simxGetObjectFloatParameter(self, clientID, objectHandle, parameterID, operationMode):
+        sensor = self._object(objectHandle, _FakeVisionSensor)
+        if sensor is None or parameterID not in (vc.sim_visionfloatparam_near_clipping,
+                                                 vc.sim_visionfloatparam_far_clipping):
+            return vc.simx_return_remote_error_flag, 0.0
+        if not self._reply(("simxGetObjectFloatParameter", objectHandle, parameterID), operationMode):
+            return vc.simx_return_novalue_flag, 0.0
+        if parameterID == vc.sim_visionfloatparam_near_clipping:
+            return vc.simx_return_ok, sensor.near_clipping
+        return vc.simx_return_ok, sensor.far_clipping
+
+    def simxGetObjectPosition(self, clientID, objectHandle, relativeToObjectHandle, operationMode):
+        obj = self._object(objectHandle)
+        if obj is None:
+            return vc.simx_return_remote_error_flag, [0.0, 0.0, 0.0]
+        if not self._reply(("simxGetObjectPosition", objectHandle, relativeToObjectHandle), operationMode):
+            return vc.simx_return_novalue_flag, [0.0, 0.0, 0.0]
+        return vc.simx_return_ok, self._relative_pose(obj, relativeToObjectHandle)[1].tolist()
+
+    def simxGetObjectOrientation(self, clientID, objectHandle, relativeToObjectHandle, operationMode):
+        obj = self._object(objectHandle)
+        if obj is None:
+            return vc.simx_return_remote_error_flag, [0.0, 0.0, 0.0]
+        if not self._reply(("simxGetObjectOrientation", objectHandle, relativeToObjectHandle), operationMode):
+            return vc.simx_return_novalue_flag, [0.0, 0.0, 0.0]
+        return vc.simx_return_ok, _euler(self._relative_pose(obj, relativeToObjectHandle)[0])
+
+    def simxGetObjectQuaternion(self, clientID, objectHandle, relativeToObjectHandle, operationMode):
+        obj = self._object(objectHandle)
+        if obj is None:
+            return vc.simx_return_remote_error_flag, [0.0, 0.0, 0.0, 0.0]
+        if not self._reply(("simxGetObjectQuaternion", objectHandle, relativeToObjectHandle), operationMode):
+            return vc.simx_return_novalue_flag, [0.0, 0.0, 0.0, 0.0]
+        rotation = self._relative_pose(obj, relativeToObjectHandle)[0]
+        return vc.simx_return_ok, transforms.matrix_to_quaternion(rotation).tolist()
+
+    def simxGetObjectVelocity(self, clientID, objectHandle, operationMode):
+        obj = self._object(objectHandle)
+        if obj is None:
+            return vc.simx_return_remote_error_flag, [0.0, 0.0, 0.0], [0.0, 0.0, 0.0]
+        if not self._reply(("simxGetObjectVelocity", objectHandle), operationMode):
+            return vc.simx_return_novalue_flag, [0.0, 0.0, 0.0], [0.0, 0.0, 0.0]
+        return vc.simx_return_ok, obj.linear_velocity.tolist(), obj.angular_velocity.tolist()
+
+    # Joints
+
+    def _joint_getter(self, function, jointHandle, operationMode, get, default):
+        joint = self._object(jointHandle, _FakeJoint)
+        if joint is None:
+            return vc.simx_return_remote_error_flag, default
+        if not self._reply((function, jointHandle), operationMode):
+            return vc.simx_return_novalue_flag, default
+        return vc.simx_return_ok, get(joint)
+
+    def _joint_setter(self, jointHandle, operationMode, apply):
+        joint = self._object(jointHandle, _FakeJoint)
+        if joint is None:
+            return vc.simx_return_remote_error_flag
+        return self._command(operationMode, lambda: apply(joint))
+
+    def simxGetJointForce(self, clientID, jointHandle, operationMode):
+        return self._joint_getter("simxGetJointForce", jointHandle, operationMode,
+                                  lambda joint: joint.force, 0.0)
+
+    def simxGetJointMatrix(self, clientID, jointHandle, operationMode):
+        return self._joint_getter("simxGetJointMatrix", jointHandle, operationMode,
+                                  lambda joint: list(joint.matrix), [])
+
+    def simxGetJointPosition(self, clientID, jointHandle, operationMode):
+        return self._joint_getter("simxGetJointPosition", jointHandle, operationMode,
+                                  lambda joint: joint.joint_position, 0.0)
+
+    def simxSetJointForce(self, clientID, jointHandle, force, operationMode):
+        return self._joint_setter(jointHandle, operationMode,
+                                  lambda joint: setattr(joint, "max_force", force))
+
+    def simxSetJointPosition(self, clientID, jointHandle, position, operationMode):
+        return self._joint_setter(jointHandle, operationMode,
+                                  lambda joint: setattr(joint, "joint_position", position))
+
+    def simxSetJointTargetPosition(self, clientID, jointHandle, targetPosition, operationMode):
+        return self._joint_setter(jointHandle, operationMode,
+                                  lambda joint: setattr(joint, "target_position", targetPosition))
+
+    def simxSetJointTargetVelocity(self, clientID, jointHandle, targetVelocity, operationMode):
+        def apply(joint):
+            joint.target_position = None
+            joint.target_velocity = targetVelocity
+        return self._joint_setter(jointHandle, operationMode, apply)
+
+    def simxSetSphericalJointMatrix(self, clientID, jointHandle, matrix, operationMode):
+        return self._joint_setter(jointHandle, operationMode,
+                                  lambda joint: setattr(joint, "matrix", list(matrix)))
+
+    # Sensors
+
+    def simxReadProximitySensor(self, clientID, sensorHandle, operationMode):
+        sensor = self._object(sensorHandle, _FakeProximitySensor)
+        if sensor is None:
+            return vc.simx_return_remote_error_flag, False, [0.0, 0.0, 0.0], 0, [0.0, 0.0, 0.0]
+        if not self._reply(("simxReadProximitySensor", sensorHandle), operationMode):
+            return vc.simx_return_novalue_flag, False, [0.0, 0.0, 0.0], 0, [0.0, 0.0, 0.0]
+        state, point, normal, detected = sensor.detect(self._shapes)
+        return vc.simx_return_ok, state, point, detected, normal
+
+    def simxReadForceSensor(self, clientID, forceSensorHandle, operationMode):
+        if self._object(forceSensorHandle, _FakeForceSensor) is None:
+            return vc.simx_return_remote_error_flag, 0, [0.0, 0.0, 0.0], [0.0, 0.0, 0.0]
+        if not self._reply(("simxReadForceSensor", forceSensorHandle), operationMode):
+            return vc.simx_return_novalue_flag, 0, [0.0, 0.0, 0.0], [0.0, 0.0, 0.0]
+        return vc.simx_return_ok, 1, [0.0, 0.0, 0.0], [0.0, 0.0, 0.0]
+
+    def simxReadVisionSensor(self, clientID, sensorHandle, operationMode):
+        if self._object(sensorHandle, _FakeVisionSensor) is None:
+            return vc.simx_return_remote_error_flag, False, []
+        if not self._reply(("simxReadVisionSensor", sensorHandle), operationMode):
+            return vc.simx_return_novalue_flag, False, []
+        return vc.simx_return_ok, False, []
+
+    def simxGetVisionSensorImageNumpy(self, clientID, sensorHandle, options, operationMode, out=None):
+        sensor = self._object(sensorHandle, _FakeVisionSensor)
+        if sensor is None:
+            return vc.simx_return_remote_error_flag, [], None
+        if not self._reply(("simxGetVisionSensorImage", sensorHandle, options), operationMode):
+            return vc.simx_return_novalue_flag, [], None
+        image = sensor.image(self._time, (options & 1) != 0)
+        if out is not None and out.size == image.size:
+            np.copyto(out, image)
+            image = out
+        return vc.simx_return_ok, list(sensor.resolution), image
+
+    def simxGetVisionSensorDepthBufferNumpy(self, clientID, sensorHandle, operationMode, out=None):
+        sensor = self._object(sensorHandle, _FakeVisionSensor)
+        if sensor is None:
+            return vc.simx_return_remote_error_flag, [], None
+        if not self._reply(("simxGetVisionSensorDepthBuffer", sensorHandle), operationMode):
+            return vc.simx_return_novalue_flag, [], None
+        buffer = sensor.depth_buffer()
+        if out is not None and out.size == buffer.size:
+            np.copyto(out, buffer)
+            buffer = out
+        return vc.simx_return_ok, list(sensor.resolution), buffer
@@ -0,0 +1,48 @@
+from .vrep import vrepConst as vc
+from .backend import Backend
+from .common import NotFoundComponentError, ReturnCommandError
+
+class HandleRegistry:
+
+    """
+    Cache of object handles by name, shared by the components of a connection.
+    The names of all scene objects are resolved with a single request,
+    other names (e.g. with a '#' suffix) are looked up one by one.
+    """
+
+    # simxGetObjectGroupData data type of object names (in stringData)
+    _NAMES_DATA_TYPE = 0
+
+    def __init__(self, backend: Backend, client_id):
+        self._backend = backend
+        self._id = client_id
+        self._handles = None
+
+    def get(self, name: str) -> int:
+        if self._handles is None:
+            self._handles = self._get_scene_handles()
+        handle = self._handles.get(name)
+        if handle is None:
+            handle = self._get_object_handle(name)
+            self._handles[name] = handle
+        return handle
+
+    def invalidate(self):
+        """
+        Forgets all resolved handles, e.g. after the scene was reloaded.
+        """
+        self._handles = None
+
+    def _get_scene_handles(self):
+        code, handles, _, _, names = self._backend.simxGetObjectGroupData(
+            self._id, vc.sim_appobj_object_type, self._NAMES_DATA_TYPE,
+            vc.simx_opmode_oneshot_wait)
+        if code == vc.simx_return_ok:
+            return dict(zip(names, handles))
+        raise ReturnCommandError(code)
+
+    def _get_object_handle(self, name):
+        code, handle = self._backend.simxGetObjectHandle(self._id, name, vc.simx_opmode_oneshot_wait)
+        if code == vc.simx_return_ok:
+            return handle
+        raise NotFoundComponentError(name, code)
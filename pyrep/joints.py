@@ -1,9 +1,13 @@
-from .vrep import vrep as v
+import numpy as np
 from .vrep import vrepConst as vc
-from .common import NotFoundComponentError, MatchObjTypeError, ReturnCommandError
+from .common import MatchObjTypeError, ReturnCommandError
+from .backend import Backend
+from .handles import HandleRegistry
+from .simulation import Simulation
 
 class AnyJoint:
-    def __init__(self, client_id, handle, low_limit, joint_range):
+    def __init__(self, backend, client_id, handle, low_limit, joint_range):
+        self._backend = backend
         self._id = client_id
         self._handle = handle
         self._low_limit = low_limit
@@ -18,75 +22,75 @@ class AnyJoint:
     def get_force(self, op_mode=None):
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
-        code, force = v.simxGetJointForce(
+        code, force = self._backend.simxGetJointForce(
             self._id, self._handle, op_mode)
-        if code == v.simx_return_ok:
+        if code == vc.simx_return_ok:
             return force
-        elif code == v.simx_return_novalue_flag:
+        elif code == vc.simx_return_novalue_flag:
             return None
         raise ReturnCommandError(code)
 
     def get_matrix(self, op_mode=None):
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
-        code, matrix = v.simxGetJointMatrix(
+        code, matrix = self._backend.simxGetJointMatrix(
             self._id, self._handle, op_mode)
-        if code == v.simx_return_ok:
+        if code == vc.simx_return_ok:
             return matrix
-        elif code == v.simx_return_novalue_flag:
+        elif code == vc.simx_return_novalue_flag:
             return None
         raise ReturnCommandError(code)
 
     def get_position(self, op_mode=None):
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
-        code, position = v.simxGetJointPosition(
+        code, position = self._backend.simxGetJointPosition(
             self._id, self._handle, op_mode)
-        if code == v.simx_return_ok:
+        if code == vc.simx_return_ok:
             return position
-        elif code == v.simx_return_novalue_flag:
+        elif code == vc.simx_return_novalue_flag:
             return None
         raise ReturnCommandError(code)
 
     def set_maximum_force(self, force, op_mode=None):
         if op_mode is None:
             op_mode = vc.simx_opmode_oneshot
-        code = v.simxSetJointForce(
+        code = self._backend.simxSetJointForce(
             self._id, self._handle, force, op_mode)
-        if code not in (v.simx_return_ok, v.simx_return_novalue_flag):
+        if code not in (vc.simx_return_ok, vc.simx_return_novalue_flag):
             raise ReturnCommandError(code)
 
     def set_position(self, position, op_mode=None):
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
-        code = v.simxSetJointPosition(
+        code = self._backend.simxSetJointPosition(
             self._id, self._handle, position, op_mode)
-        if code not in (v.simx_return_ok, v.simx_return_novalue_flag):
+        if code not in (vc.simx_return_ok, vc.simx_return_novalue_flag):
             raise ReturnCommandError(code)
 
     def set_target_position(self, target, op_mode=None):
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
-        code = v.simxSetJointTargetPosition(
+        code = self._backend.simxSetJointTargetPosition(
             self._id, self._handle, target, op_mode)
-        if code not in (v.simx_return_ok, v.simx_return_novalue_flag):
+        if code not in (vc.simx_return_ok, vc.simx_return_novalue_flag):
             raise ReturnCommandError(code)
 
     def set_target_velocity(self, target, op_mode=None):
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
-        code = v.simxSetJointTargetVelocity(
+        code = self._backend.simxSetJointTargetVelocity(
             self._id, self._handle, target, op_mode)
-        if code not in (v.simx_return_ok, v.simx_return_novalue_flag):
+        if code not in (vc.simx_return_ok, vc.simx_return_novalue_flag):
             raise ReturnCommandError(code)
 
     def set_matrix(self, matrix, op_mode=None):
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
         assert len(matrix) == 12
-        code = v.simxSetSphericalJointMatrix(
+        code = self._backend.simxSetSphericalJointMatrix(
             self._id, self._handle, matrix, op_mode)
-        if code not in (v.simx_return_ok, v.simx_return_novalue_flag):
+        if code not in (vc.simx_return_ok, vc.simx_return_novalue_flag):
             raise ReturnCommandError(code)
 
 
@@ -171,10 +175,97 @@ class SpringJoint:
         self._any_joint.set_target_velocity(target, op_mode)
 
 
+class JointGroup:
+
+    """
+    Group of joints commanded and read with vectors.
+    The commands to all joints are sent in one batched transmission.
+    """
+
+    def __init__(self, joints, simulation: Simulation):
+        self._joints = list(joints)
+        self._simulation = simulation
+
+    def __len__(self):
+        return len(self._joints)
+
+    def set_target_positions(self, targets, op_mode=None):
+        targets = self._as_values(targets)
+        with self._simulation.batch():
+            for joint, target in zip(self._joints, targets):
+                joint.set_target_position(target, op_mode)
+
+    def set_target_velocities(self, targets, op_mode=None):
+        targets = self._as_values(targets)
+        with self._simulation.batch():
+            for joint, target in zip(self._joints, targets):
+                joint.set_target_velocity(target, op_mode)
+
+    def set_positions(self, positions, op_mode=None):
+        positions = self._as_values(positions)
+        with self._simulation.batch():
+            for joint, position in zip(self._joints, positions):
+                joint.set_position(position, op_mode)
+
+    def set_maximum_forces(self, forces, op_mode=None):
+        forces = self._as_values(forces)
+        with self._simulation.batch():
+            for joint, force in zip(self._joints, forces):
+                joint.set_maximum_force(force, op_mode)
+
+    def get_positions(self, op_mode=None) -> np.ndarray:
+        """
+        @return positions of the joints, or None if one is not yet available
+        @rtype numpy array of N float32
+        """
+        return self._as_vector([joint.get_position(op_mode) for joint in self._joints])
+
+    def get_forces(self, op_mode=None) -> np.ndarray:
+        """
+        @return forces or torques of the joints, or None if one is not yet available
+        @rtype numpy array of N float32
+        """
+        return self._as_vector([joint.get_force(op_mode) for joint in self._joints])
+
+    def _as_values(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) != len(self._joints):
+            raise ValueError("Expected {} values, got {}".format(len(self._joints), len(values)))
+        return values.tolist()
+
+    @staticmethod
+    def _as_vector(values):
+        if None in values:
+            return None
+        return np.array(values, dtype=np.float32)
+
+
 class Joints:
 
-    def __init__(self, client_id):
+    def __init__(self, backend: Backend, client_id, handles: HandleRegistry, simulation: Simulation):
+        self._backend = backend
         self._id = client_id
+        self._handles = handles
+        self._simulation = simulation
+        self._joint_info = None
+        # Handles found not to be joints in the current scene
+        self._not_joints = set()
+
+    def refresh(self):
+        """
+        Fetches again the properties of all joints of the scene,
+        e.g. after the scene was reloaded.
+        """
+        self.invalidate()
+        self._joint_info = self._get_joints_info()
+
+    def invalidate(self):
+        """
+        Forgets the joint properties, fetched again on the next lookup,
+        e.g. after the scene was reloaded.
+        """
+        self._joint_info = None
+        self._not_joints = set()
 
     def spherical(self, name: str) -> SphericalJoint:
         """
@@ -239,29 +330,57 @@ class Joints:
             vc.sim_jointmode_force)
         return JointWithVelocityControl(joint)
 
+    def group(self, names) -> JointGroup:
+        """
+        Retrieves the joints of any type and mode as a JointGroup,
+        in the order of the names.
+        """
+        return JointGroup([self._get_joint(name) for name in names], self._simulation)
+
+    def _get_joint(self, name) -> AnyJoint:
+        handle, info = self._get_joint_handle_and_info(name)
+        _, _, low_limit, joint_range = info
+        return AnyJoint(self._backend, self._id, handle, low_limit, joint_range)
+
     def _get_joint_with_param(self, name, types, joint_mode) -> AnyJoint:
-        handle = self._get_object_handle(name)
-        joint_type, curr_mode, low_limit, joint_range = self._get_info_about_joint(handle)
+        handle, info = self._get_joint_handle_and_info(name)
+        joint_type, curr_mode, low_limit, joint_range = info
         if joint_type in types and curr_mode == joint_mode:
-            return AnyJoint(self._id, handle, low_limit, joint_range)
+            return AnyJoint(self._backend, self._id, handle, low_limit, joint_range)
         raise MatchObjTypeError(name)
 
+    def _get_joint_handle_and_info(self, name):
+        handle = self._get_object_handle(name)
+        info = self._get_info_about_joint(handle)
+        if info is None:
+            # Not a joint
+            raise MatchObjTypeError(name)
+        return handle, info
+
     def _get_info_about_joint(self, handle):
+        if self._joint_info is None or \
+                (handle not in self._joint_info and handle not in self._not_joints):
+            # The joint may have been added to the scene after the last fetch;
+            # an object that is not a joint is only looked for once per scene
+            self._joint_info = self._get_joints_info()
+        info = self._joint_info.get(handle)
+        if info is None:
+            self._not_joints.add(handle)
+        return info
+
+    def _get_joints_info(self):
         obj_type_code = vc.sim_object_joint_type
         # 16: retrieves joint properties data
         # in intData (2 values): joint type, joint mode (bit16=hybid operation
         # In floatData (2 values): joint limit low, joint range (-1.0 if joint is cyclic)
         data_type_code = 16
-        code, handles, types_and_mode, limits_and_ranges, _ = v.simxGetObjectGroupData(
+        code, handles, types_and_mode, limits_and_ranges, _ = self._backend.simxGetObjectGroupData(
             self._id, obj_type_code, data_type_code, vc.simx_opmode_oneshot_wait)
-        if code == v.simx_return_ok:
-            index = handles.index(handle)
-            index = index * 2
-            return types_and_mode[index], types_and_mode[index+1], limits_and_ranges[index], limits_and_ranges[index+1]
+        if code == vc.simx_return_ok:
+            return dict(zip(handles, zip(
+                types_and_mode[0::2], types_and_mode[1::2],
+                limits_and_ranges[0::2], limits_and_ranges[1::2])))
         raise ReturnCommandError(code)
 
     def _get_object_handle(self, name):
-        code, handle = v.simxGetObjectHandle(self._id, name, vc.simx_opmode_oneshot_wait)
-        if code == v.simx_return_ok:
-            return handle
-        raise NotFoundComponentError(name, code)
+        return self._handles.get(name)
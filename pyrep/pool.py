@@ -0,0 +1,257 @@
+import multiprocessing
+import time
+import traceback
+import numpy as np
+from .api import VRepApi
+
+# Result of a worker that was left out or failed, as a rollout may return None
+_NO_RESULT = object()
+
+
+class WorkerHealth:
+
+    """
+    State of the worker process driving one simulation of a SimulationPool.
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.alive = False
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_duration = None
+
+    def __repr__(self):
+        return "WorkerHealth(endpoint={}, alive={}, calls={}, failures={}, consecutive_failures={})".format(
+            self.endpoint, self.alive, self.calls, self.failures, self.consecutive_failures)
+
+
+class SimulationPool:
+
+    """
+    Connections to several V-REP servers, each one owned by a worker process,
+    on which rollout functions run in parallel.
+    A rollout is a picklable function (e.g. defined at module level) called
+    as rollout(api, *args) in the worker, api being its VRepApi.
+    A worker failing max_failures times in a row, or not replying in time,
+    is left out until it is restarted.
+    """
+
+    def __init__(self, endpoints, synchronous=False, backend_factory=None,
+                 connect_timeout=10.0, max_failures=3, start_method=None):
+        """
+        @param endpoints (ip, port) of the servers
+        @param backend_factory picklable function returning the Backend of a worker,
+        the default backend is used if None
+        @param start_method multiprocessing start method, the platform default if None
+        """
+        self._endpoints = [tuple(endpoint) for endpoint in endpoints]
+        self._synchronous = synchronous
+        self._backend_factory = backend_factory
+        self._connect_timeout = connect_timeout
+        self._max_failures = max_failures
+        self._context = multiprocessing.get_context(start_method)
+        self._processes = [None] * len(self._endpoints)
+        self._connections = [None] * len(self._endpoints)
+        self._health = [WorkerHealth(endpoint) for endpoint in self._endpoints]
+        for index in range(len(self._endpoints)):
+            self._start(index)
+        for index in range(len(self._endpoints)):
+            self._wait_connected(index)
+
+    def __len__(self):
+        return len(self._endpoints)
+
+    def health(self) -> list:
+        """
+        @rtype list of WorkerHealth, in the order of the endpoints
+        """
+        return list(self._health)
+
+    def healthy(self) -> list:
+        """
+        @return indices of the workers rollouts are sent to
+        """
+        return [index for index, health in enumerate(self._health)
+                if health.alive and health.consecutive_failures < self._max_failures]
+
+    def run(self, rollout, *args, timeout=None) -> list:
+        """
+        Runs rollout on all healthy workers in parallel.
+        @return results in the order of the endpoints, None for the workers
+        that were left out or failed (@see health; gather tells them apart
+        from rollouts returning None)
+        """
+        return [None if result is _NO_RESULT else result
+                for result in self._run(rollout, args, timeout)]
+
+    def _run(self, rollout, args, timeout):
+        indices = self.healthy()
+        starts = {}
+        for index in indices:
+            starts[index] = time.monotonic()
+            try:
+                self._connections[index].send((rollout, args))
+            except (OSError, EOFError):
+                self._fail(index, "Worker process has exited", alive=False)
+                # Its process and connection are released now rather than on close
+                self._stop(index)
+        results = [_NO_RESULT] * len(self._endpoints)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for index in indices:
+            if not self._health[index].alive:
+                continue
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            reply = self._receive(index, remaining)
+            if reply is None:
+                continue
+            status, value = reply
+            health = self._health[index]
+            health.calls += 1
+            health.last_duration = time.monotonic() - starts[index]
+            if status == "ok":
+                health.consecutive_failures = 0
+                results[index] = value
+            else:
+                self._fail(index, value)
+        return results
+
+    def gather(self, rollout, *args, timeout=None):
+        """
+        Runs rollout on all healthy workers in parallel and stacks the results
+        of the successful ones: arrays and numbers are stacked along a new first
+        axis, tuples and dicts of them element by element.
+        @return stacked results and indices of the workers they come from
+        @rtype (stacked results, numpy array of int)
+        """
+        results = self._run(rollout, args, timeout)
+        indices = [index for index, result in enumerate(results) if result is not _NO_RESULT]
+        if not indices:
+            raise RuntimeError("No worker of the pool returned a result: " + repr(self._health))
+        return stack_results([results[index] for index in indices]), np.array(indices, dtype=np.intp)
+
+    def restart(self, index=None):
+        """
+        Restarts a worker (all the workers that are not healthy if index is None),
+        reconnecting it to its server.
+        """
+        healthy = self.healthy()
+        indices = [index] if index is not None else \
+            [i for i in range(len(self._endpoints)) if i not in healthy]
+        for i in indices:
+            self._stop(i)
+            self._health[i].consecutive_failures = 0
+            self._start(i)
+        for i in indices:
+            self._wait_connected(i)
+
+    def close(self):
+        for index in range(len(self._endpoints)):
+            self._stop(index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _start(self, index):
+        ip, port = self._endpoints[index]
+        parent_connection, child_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker, args=(ip, port, self._synchronous, self._backend_factory, child_connection),
+            daemon=True)
+        process.start()
+        child_connection.close()
+        self._processes[index] = process
+        self._connections[index] = parent_connection
+
+    def _wait_connected(self, index):
+        reply = self._receive(index, self._connect_timeout)
+        if reply is None:
+            return
+        status, value = reply
+        if status == "ok":
+            self._health[index].alive = True
+        else:
+            self._fail(index, value, alive=False)
+
+    def _receive(self, index, timeout):
+        connection = self._connections[index]
+        try:
+            if connection.poll(timeout):
+                return connection.recv()
+            error = "No reply within {} s".format(timeout)
+        except (OSError, EOFError):
+            error = "Worker process has exited"
+        # The worker is stuck or dead, it is not reused
+        self._fail(index, error, alive=False)
+        self._stop(index)
+        return None
+
+    def _fail(self, index, error, alive=True):
+        health = self._health[index]
+        health.failures += 1
+        health.consecutive_failures += 1
+        health.last_error = error
+        health.alive = health.alive and alive
+
+    def _stop(self, index):
+        process = self._processes[index]
+        connection = self._connections[index]
+        if process is None:
+            return
+        try:
+            connection.send(None)
+        except (OSError, EOFError):
+            pass
+        process.join(1.0)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+        connection.close()
+        self._processes[index] = None
+        self._connections[index] = None
+        self._health[index].alive = False
+
+
+def stack_results(results):
+    """
+    Stacks the results of rollouts: arrays and numbers along a new first axis,
+    tuples and dicts of them element by element.
+    """
+    first = results[0]
+    if isinstance(first, tuple):
+        return tuple(stack_results([result[i] for result in results]) for i in range(len(first)))
+    if isinstance(first, dict):
+        return {key: stack_results([result[key] for result in results]) for key in first}
+    return np.stack([np.asarray(result) for result in results])
+
+
+def _worker(ip, port, synchronous, backend_factory, connection):
+    try:
+        backend = backend_factory() if backend_factory is not None else None
+        api = VRepApi.connect(ip, port, synchronous, backend)
+    except Exception:
+        connection.send(("error", traceback.format_exc()))
+        return
+    connection.send(("ok", None))
+    try:
+        while True:
+            try:
+                message = connection.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            rollout, args = message
+            try:
+                result = rollout(api, *args)
+            except Exception:
+                connection.send(("error", traceback.format_exc()))
+            else:
+                connection.send(("ok", result))
+    finally:
+        api.close_connection()
@@ -0,0 +1,349 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+from .vrep import vrepConst as vc
+from .backend import Backend
+from .stats import InstrumentedBackend
+
+
+class RecordedStream:
+
+    """
+    Records of one stream of a log: readings of a function for one object.
+    records is a numpy structured array with the fields time (simulation time
+    of the last message received, in ms), wall (wall clock time, in s),
+    handle, and the fields of the reading (@see StreamRecorder.LAYOUTS).
+    relative_to is the reference frame of the readings of the functions
+    taking one (@see StreamRecorder.RELATIVE_FUNCTIONS), None for the others.
+    path is the file of the stream.
+    """
+
+    def __init__(self, function: str, handle: int, records: np.ndarray, path=None, relative_to=None):
+        self.function = function
+        self.handle = handle
+        self.records = records
+        self.path = path
+        self.relative_to = relative_to
+
+    def __len__(self):
+        return len(self.records)
+
+    def __repr__(self):
+        return "RecordedStream({}, {}, {}, {} records)".format(
+            self.function, self.handle, self.relative_to, len(self.records))
+
+
+class StreamRecorder:
+
+    """
+    Appends the sensor and joint readings received by a connection to a log
+    directory, as fixed-layout records in one preallocated memory-mapped file
+    per stream (function and object handle). Images are stored as raw frames,
+    so recording a reading copies it once into the file.
+    The layout of the files is described in index.json, written when a stream
+    or metadata is added and on flush and close, along with the object names,
+    joint properties and vision sensor parameters read by the connection
+    (@see record_metadata). Each file starts with a header holding its record
+    count, updated on every record, so a log is readable even if the recording
+    process was killed before close.
+    Readings whose simulation time has not advanced since the last record of
+    their stream (e.g. the same reply read again from the input buffer) are skipped.
+    """
+
+    # Fields of the recorded functions: name, dtype and position in the returned tuple
+    LAYOUTS = {
+        "simxReadProximitySensor": (("state", "u1", 1), ("point", "<f4", 2), ("object", "<i4", 3), ("normal", "<f4", 4)),
+        "simxReadForceSensor": (("state", "u1", 1), ("force", "<f4", 2), ("torque", "<f4", 3)),
+        "simxGetObjectPosition": (("position", "<f4", 1),),
+        "simxGetObjectOrientation": (("orientation", "<f4", 1),),
+        "simxGetObjectVelocity": (("linear", "<f4", 1), ("angular", "<f4", 2)),
+        "simxGetJointPosition": (("position", "<f4", 1),),
+        "simxGetJointForce": (("force", "<f4", 1),),
+        "simxGetVisionSensorImageNumpy": (("resolution", "<i4", 1), ("image", "u1", 2)),
+        "simxGetVisionSensorDepthBufferNumpy": (("resolution", "<i4", 1), ("depth", "<f4", 2)),
+    }
+
+    # Functions whose readings are relative to a reference frame (relativeToObjectHandle),
+    # recorded in a stream per frame
+    RELATIVE_FUNCTIONS = ("simxGetObjectPosition", "simxGetObjectOrientation")
+
+    INDEX_FILE = "index.json"
+
+    # simxGetObjectGroupData data types kept in the metadata: object names, joint properties
+    METADATA_GROUP_DATA_TYPES = (0, 16)
+
+    def __init__(self, directory: str, capacity=1024):
+        """
+        @param capacity records preallocated per stream, doubled when full
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.enabled = True
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        self._streams = {}
+        self._files = []
+        self._metadata = {"handles": {}, "group_data": {}, "float_parameters": {}}
+
+    def record(self, function: str, handle: int, sim_time: int, result: tuple, relative_to=None):
+        """
+        Appends a reading, result being the successful return value of function,
+        relative_to the reference frame of the functions taking one (-1 for the world).
+        """
+        layout = self.LAYOUTS[function]
+        if function in self.RELATIVE_FUNCTIONS and relative_to is None:
+            relative_to = -1
+        key = (function, handle, relative_to)
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is not None and stream.count and stream.last_time == sim_time:
+                return
+            values = [result[position] for _, _, position in layout]
+            shapes = tuple(np.shape(value) for value in values)
+            if stream is None or stream.shapes != shapes:
+                # New stream, or the size of its readings has changed (e.g. image resolution)
+                stream = _StreamFile(self._next_path(function, handle, relative_to), function, handle,
+                                     relative_to, layout, shapes, self._capacity)
+                self._streams[key] = stream
+                self._files.append(stream)
+                self._write_index()
+            stream.append(sim_time, time.time(), handle, values)
+
+    def record_metadata(self, kind: str, key, value):
+        """
+        Keeps a reply describing the scene rather than its state:
+        kind "handles" (key: object name, value: handle),
+        "group_data" (key: (object type, data type), value: handles, ints, floats, strings)
+        or "float_parameters" (key: (handle, parameter), value: float).
+        """
+        if not isinstance(key, str):
+            key = ",".join(str(part) for part in key)
+        with self._lock:
+            if self._metadata[kind].get(key) != value:
+                self._metadata[kind][key] = value
+                self._write_index()
+
+    def flush(self):
+        with self._lock:
+            for stream in self._files:
+                stream.flush()
+            self._write_index()
+
+    def close(self):
+        with self._lock:
+            for stream in self._files:
+                stream.close()
+            self._write_index()
+            self._streams = {}
+            self._files = []
+
+    def _next_path(self, function, handle, relative_to):
+        name = "{}_{}".format(function, handle)
+        if relative_to is not None:
+            name += "_rel{}".format(relative_to)
+        segment = sum(1 for stream in self._files if stream.function == function and
+                      stream.handle == handle and stream.relative_to == relative_to)
+        if segment:
+            name += "_" + str(segment)
+        return os.path.join(self.directory, name + ".bin")
+
+    def _write_index(self):
+        streams = [{
+            "file": os.path.basename(stream.path),
+            "function": stream.function,
+            "handle": stream.handle,
+            "relative_to": stream.relative_to,
+            "dtype": stream.dtype.descr,
+            "offset": _StreamFile.HEADER_SIZE,
+            "count": stream.count,
+        } for stream in self._files]
+        metadata = {kind: dict(values) for kind, values in self._metadata.items()}
+        path = os.path.join(self.directory, self.INDEX_FILE)
+        # Entries of a previous recorder in the same directory are kept
+        if os.path.exists(path):
+            with open(path) as index_file:
+                previous = json.load(index_file)
+            files = set(stream["file"] for stream in streams)
+            streams = [stream for stream in previous["streams"] if stream["file"] not in files] + streams
+            for kind, values in previous.get("metadata", {}).items():
+                metadata[kind] = dict(values, **metadata[kind])
+        with open(path, "w") as index_file:
+            json.dump({"streams": streams, "metadata": metadata}, index_file, indent=1)
+
+
+def read_log(directory: str) -> list:
+    """
+    Opens the streams of a log directory, memory-mapped read-only.
+    @rtype list of RecordedStream
+    """
+    with open(os.path.join(directory, StreamRecorder.INDEX_FILE)) as index_file:
+        entries = json.load(index_file)["streams"]
+    streams = []
+    for entry in entries:
+        dtype = np.dtype([tuple(field[:2]) + tuple(tuple(shape) for shape in field[2:])
+                          for field in entry["dtype"]])
+        path = os.path.join(directory, entry["file"])
+        offset = entry.get("offset", 0)
+        count = entry["count"]
+        if offset:
+            # The count of the header is up to date even if the recorder was not closed
+            header = np.fromfile(path, dtype=_StreamFile.HEADER, count=1)
+            if len(header) and header["magic"][0] == _StreamFile.MAGIC:
+                count = int(header["count"][0])
+            count = min(count, max(os.path.getsize(path) - offset, 0) // dtype.itemsize)
+        if count:
+            records = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+        else:
+            records = np.empty(0, dtype=dtype)
+        # Logs without frames were recorded in the world frame
+        relative_to = entry.get("relative_to", -1 if entry["function"] in StreamRecorder.RELATIVE_FUNCTIONS else None)
+        streams.append(RecordedStream(entry["function"], entry["handle"], records, path, relative_to))
+    return streams
+
+
+def read_log_metadata(directory: str) -> dict:
+    """
+    @return metadata of a log directory (@see StreamRecorder.record_metadata),
+    with keys of several parts joined by commas
+    """
+    with open(os.path.join(directory, StreamRecorder.INDEX_FILE)) as index_file:
+        return json.load(index_file).get("metadata", {"handles": {}, "group_data": {}, "float_parameters": {}})
+
+
+class _StreamFile:
+
+    # Header of the file, before the records: magic and record count
+    HEADER = np.dtype([("magic", "S8"), ("count", "<i8")])
+    HEADER_SIZE = 64
+    MAGIC = b"PYREPLOG"
+
+    def __init__(self, path, function, handle, relative_to, layout, shapes, capacity):
+        self.path = path
+        self.function = function
+        self.handle = handle
+        self.relative_to = relative_to
+        self.shapes = shapes
+        self.dtype = np.dtype([("time", "<i4"), ("wall", "<f8"), ("handle", "<i4")] +
+                              [(name, dtype, shape) for (name, dtype, _), shape in zip(layout, shapes)])
+        self._names = [name for name, _, _ in layout]
+        self.count = 0
+        self.last_time = None
+        with open(path, "wb") as stream_file:
+            stream_file.truncate(self.HEADER_SIZE + capacity * self.dtype.itemsize)
+        self._header = np.memmap(path, dtype=self.HEADER, mode="r+", shape=(1,))
+        self._header["magic"] = self.MAGIC
+        self._header["count"] = 0
+        self._map(capacity)
+
+    def append(self, sim_time, wall, handle, values):
+        if self.count == len(self._records):
+            self._grow()
+        i = self.count
+        columns = self._columns
+        columns["time"][i] = sim_time
+        columns["wall"][i] = wall
+        columns["handle"][i] = handle
+        for name, value in zip(self._names, values):
+            columns[name][i] = value
+        self.count += 1
+        self.last_time = sim_time
+        # Counted once written, so the header never counts a partial record
+        self._header["count"] = self.count
+
+    def flush(self):
+        if self._records is not None:
+            self._records.flush()
+            self._header.flush()
+
+    def close(self):
+        if self._records is None:
+            return
+        self.flush()
+        self._records = None
+        self._columns = None
+        self._header = None
+        # The preallocated space past the last record is given back
+        with open(self.path, "r+b") as stream_file:
+            stream_file.truncate(self.HEADER_SIZE + self.count * self.dtype.itemsize)
+
+    def _grow(self):
+        capacity = 2 * len(self._records)
+        self._records.flush()
+        self._records = None
+        with open(self.path, "r+b") as stream_file:
+            stream_file.truncate(self.HEADER_SIZE + capacity * self.dtype.itemsize)
+        self._map(capacity)
+
+    def _map(self, capacity):
+        self._records = np.memmap(self.path, dtype=self.dtype, mode="r+",
+                                  offset=self.HEADER_SIZE, shape=(capacity,))
+        self._columns = self._split(self._records)
+
+    def _split(self, records):
+        # Field views are made once, not per record
+        return {name: records[name] for name in records.dtype.names}
+
+
+class RecordingBackend(Backend):
+
+    """
+    Backend passing the successful replies of the recorded functions
+    (@see StreamRecorder.LAYOUTS) of another backend to a StreamRecorder,
+    as well as the replies describing the scene.
+    """
+
+    def __init__(self, backend: Backend, recorder: StreamRecorder):
+        self._backend = backend
+        self.recorder = recorder
+        # The timestamps of the records are read from the backend under any
+        # instrumentation, so the call statistics only count the calls made by the user
+        self._clock = backend
+        while isinstance(self._clock, InstrumentedBackend):
+            self._clock = self._clock._backend
+        for name in StreamRecorder.LAYOUTS:
+            setattr(self, name, self._record(name))
+
+    def __getattr__(self, name):
+        return getattr(self._backend, name)
+
+    def simxGetObjectHandle(self, clientID, objectName, operationMode):
+        result = self._backend.simxGetObjectHandle(clientID, objectName, operationMode)
+        if result[0] == vc.simx_return_ok:
+            self.recorder.record_metadata("handles", objectName, int(result[1]))
+        return result
+
+    def simxGetObjectGroupData(self, clientID, objectType, dataType, operationMode):
+        result = self._backend.simxGetObjectGroupData(clientID, objectType, dataType, operationMode)
+        if result[0] == vc.simx_return_ok and dataType in StreamRecorder.METADATA_GROUP_DATA_TYPES:
+            handles, ints, floats, strings = result[1:]
+            self.recorder.record_metadata("group_data", (objectType, dataType), [
+                np.asarray(handles).tolist(), np.asarray(ints).tolist(),
+                np.asarray(floats).tolist(), list(strings)])
+        return result
+
+    def simxGetObjectFloatParameter(self, clientID, objectHandle, parameterID, operationMode):
+        result = self._backend.simxGetObjectFloatParameter(clientID, objectHandle, parameterID, operationMode)
+        if result[0] == vc.simx_return_ok:
+            self.recorder.record_metadata("float_parameters", (objectHandle, parameterID), float(result[1]))
+        return result
+
+    def _record(self, name):
+        backend = self._backend
+        clock = self._clock
+        recorder = self.recorder
+
+        relative = name in StreamRecorder.RELATIVE_FUNCTIONS
+
+        def call(clientID, handle, *args, **kwargs):
+            result = getattr(backend, name)(clientID, handle, *args, **kwargs)
+            if recorder.enabled and result[0] == vc.simx_return_ok:
+                relative_to = None
+                if relative:
+                    relative_to = args[0] if args else kwargs["relativeToObjectHandle"]
+                recorder.record(name, handle, clock.simxGetLastCmdTime(clientID), result, relative_to)
+            return result
+
+        call.__name__ = name
+        return call
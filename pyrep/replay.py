@@ -0,0 +1,370 @@
+import os
+import time
+import numpy as np
+from .vrep import vrepConst as vc
+from .backend import Backend
+from . import transforms
+from .recorder import StreamRecorder, read_log, read_log_metadata
+
+
+class ReplayBackend(Backend):
+
+    """
+    Backend serving a log recorded by a StreamRecorder instead of a simulator,
+    so the sensors and joints of a VRepApi read the recorded values.
+    A reading is the last one recorded at or before the replay time, a
+    position on the timeline of the log: the simulation runs recorded one
+    after the other (the simulation time goes back to 0 when one is restarted).
+    Once the simulation is started, the replay time follows the wall clock,
+    scaled by speed, or advances by step_ms per trigger in synchronous mode;
+    seek() jumps anywhere. Commands sent to joints are ignored.
+    The timeline is indexed once and cached, by default in replay_index.npz
+    in the log directory; if the cache cannot be written (e.g. read-only
+    storage) the index is only kept in memory.
+    """
+
+    INDEX_FILE = "replay_index.npz"
+
+    # Values returned with simx_return_novalue_flag, after the return code
+    _NO_VALUE = {
+        "simxReadProximitySensor": (False, [0.0, 0.0, 0.0], 0, [0.0, 0.0, 0.0]),
+        "simxReadForceSensor": (0, [0.0, 0.0, 0.0], [0.0, 0.0, 0.0]),
+        "simxGetObjectPosition": ([0.0, 0.0, 0.0],),
+        "simxGetObjectOrientation": ([0.0, 0.0, 0.0],),
+        "simxGetObjectVelocity": ([0.0, 0.0, 0.0], [0.0, 0.0, 0.0]),
+        "simxGetJointPosition": (0.0,),
+        "simxGetJointForce": (0.0,),
+        "simxGetVisionSensorImageNumpy": ([0, 0], None),
+        "simxGetVisionSensorDepthBufferNumpy": ([0, 0], None),
+    }
+
+    # simxGetObjectGroupData data types of poses and proximity sensor data
+    _POSE_DATA_TYPE = 9
+    _PROXIMITY_DATA_TYPE = 13
+
+    def __init__(self, directory: str, speed=1.0, step_ms=None, index_path=None):
+        """
+        @param speed replay time elapsed per wall clock second, e.g. 10.0 for 10 times faster
+        @param step_ms replay time of a synchronous step, the recording period if None
+        @param index_path file caching the index of the timeline, in the log directory if None
+        """
+        self.speed = speed
+        self._metadata = read_log_metadata(directory)
+        streams = read_log(directory)
+        if index_path is None:
+            index_path = os.path.join(directory, self.INDEX_FILE)
+        offsets, timelines = self._load_index(index_path, streams)
+        self._run_starts = offsets
+        self._segments = {}
+        for stream, timeline in zip(streams, timelines):
+            self._segments.setdefault((stream.function, stream.handle, stream.relative_to), []).append(
+                (timeline, stream.records))
+        self.duration = max([int(timeline[-1]) for timeline in timelines if len(timeline)] + [0])
+        self.step_ms = step_ms if step_ms is not None else self._recording_period(streams)
+        self._position = 0.0
+        self._origin = None
+        self._running = False
+        self._synchronous = False
+
+    def time(self) -> float:
+        """
+        @return replay time, in ms on the timeline of the log
+        """
+        if self._origin is None:
+            return self._position
+        return min(self._position + (time.monotonic() - self._origin) * 1000.0 * self.speed, self.duration)
+
+    def seek(self, time_ms: float):
+        """
+        Moves the replay to a time of the timeline, in ms.
+        """
+        self._position = min(max(float(time_ms), 0.0), self.duration)
+        if self._origin is not None:
+            self._origin = time.monotonic()
+
+    def runs(self) -> np.ndarray:
+        """
+        @return start times of the recorded simulation runs on the timeline
+        """
+        return self._run_starts.copy()
+
+    # Connection
+
+    def simxStart(self, connectionAddress, connectionPort, waitUntilConnected,
+                  doNotReconnectOnceDisconnected, timeOutInMs, commThreadCycleInMs):
+        return 0
+
+    def simxFinish(self, clientID):
+        self._pause()
+
+    def simxGetPingTime(self, clientID):
+        return vc.simx_return_ok, 0
+
+    def simxGetLastCmdTime(self, clientID):
+        now = self.time()
+        return int(now - self._run_start(now))
+
+    def simxGetInMessageInfo(self, clientID, infoType):
+        if infoType != vc.simx_headeroffset_server_state:
+            return -1, 0
+        return 1, int(self._running)
+
+    def simxPauseCommunication(self, clientID, enable):
+        return vc.simx_return_ok
+
+    # Simulation
+
+    def simxLoadScene(self, clientID, scenePathAndName, options, operationMode):
+        return vc.simx_return_remote_error_flag
+
+    def simxStartSimulation(self, clientID, operationMode):
+        self._running = True
+        if not self._synchronous and self._origin is None:
+            self._origin = time.monotonic()
+        return vc.simx_return_ok
+
+    def simxPauseSimulation(self, clientID, operationMode):
+        self._pause()
+        return vc.simx_return_ok
+
+    def simxStopSimulation(self, clientID, operationMode):
+        self._pause()
+        self._running = False
+        self._position = 0.0
+        return vc.simx_return_ok
+
+    def simxSynchronous(self, clientID, enable):
+        self._synchronous = bool(enable)
+        if self._synchronous:
+            self._pause()
+        return vc.simx_return_ok
+
+    def simxSynchronousTrigger(self, clientID):
+        self._position = min(self._position + self.step_ms, self.duration)
+        return vc.simx_return_ok
+
+    def simxGetFloatSignal(self, clientID, signalName, operationMode):
+        return vc.simx_return_novalue_flag, 0.0
+
+    def simxGetStringSignal(self, clientID, signalName, operationMode, copy=True):
+        return vc.simx_return_novalue_flag, bytearray()
+
+    # Objects
+
+    def simxGetObjectHandle(self, clientID, objectName, operationMode):
+        handle = self._metadata["handles"].get(objectName)
+        if handle is None:
+            handle = self._names().get(objectName)
+        if handle is None:
+            return vc.simx_return_remote_error_flag, 0
+        return vc.simx_return_ok, handle
+
+    def simxGetObjectGroupData(self, clientID, objectType, dataType, operationMode):
+        if dataType == self._PROXIMITY_DATA_TYPE and objectType == vc.sim_object_proximitysensor_type:
+            return self._proximity_group_data(operationMode)
+        if dataType == self._POSE_DATA_TYPE:
+            return self._pose_group_data(operationMode)
+        data = self._metadata["group_data"].get("{},{}".format(objectType, dataType))
+        if data is None:
+            return vc.simx_return_remote_error_flag, [], [], [], []
+        return (vc.simx_return_ok,) + tuple(list(values) for values in data)
+
+    def simxGetObjectFloatParameter(self, clientID, objectHandle, parameterID, operationMode):
+        value = self._metadata["float_parameters"].get("{},{}".format(objectHandle, parameterID))
+        if value is None:
+            return vc.simx_return_remote_error_flag, 0.0
+        return vc.simx_return_ok, value
+
+    # Joints: the state of the joints is the recorded one
+
+    def simxGetJointMatrix(self, clientID, jointHandle, operationMode):
+        return vc.simx_return_novalue_flag, [0.0] * 12
+
+    def simxSetJointForce(self, clientID, jointHandle, force, operationMode):
+        return vc.simx_return_ok
+
+    def simxSetJointPosition(self, clientID, jointHandle, position, operationMode):
+        return vc.simx_return_ok
+
+    def simxSetJointTargetPosition(self, clientID, jointHandle, targetPosition, operationMode):
+        return vc.simx_return_ok
+
+    def simxSetJointTargetVelocity(self, clientID, jointHandle, targetVelocity, operationMode):
+        return vc.simx_return_ok
+
+    def simxSetSphericalJointMatrix(self, clientID, jointHandle, matrix, operationMode):
+        return vc.simx_return_ok
+
+    # Sensors
+
+    def simxReadVisionSensor(self, clientID, sensorHandle, operationMode):
+        return vc.simx_return_novalue_flag, False, []
+
+    def simxReadProximitySensor(self, clientID, sensorHandle, operationMode):
+        return self._read("simxReadProximitySensor", sensorHandle, operationMode)
+
+    def simxReadForceSensor(self, clientID, forceSensorHandle, operationMode):
+        return self._read("simxReadForceSensor", forceSensorHandle, operationMode)
+
+    def simxGetObjectPosition(self, clientID, objectHandle, relativeToObjectHandle, operationMode):
+        return self._read("simxGetObjectPosition", objectHandle, operationMode,
+                          relative_to=relativeToObjectHandle)
+
+    def simxGetObjectOrientation(self, clientID, objectHandle, relativeToObjectHandle, operationMode):
+        return self._read("simxGetObjectOrientation", objectHandle, operationMode,
+                          relative_to=relativeToObjectHandle)
+
+    def simxGetObjectQuaternion(self, clientID, objectHandle, relativeToObjectHandle, operationMode):
+        code, orientation = self._read("simxGetObjectOrientation", objectHandle, operationMode,
+                                       relative_to=relativeToObjectHandle)
+        if code != vc.simx_return_ok:
+            return code, [0.0, 0.0, 0.0, 0.0]
+        return code, transforms.euler_to_quaternion(orientation).tolist()
+
+    def simxGetObjectVelocity(self, clientID, objectHandle, operationMode):
+        return self._read("simxGetObjectVelocity", objectHandle, operationMode)
+
+    def simxGetJointPosition(self, clientID, jointHandle, operationMode):
+        return self._read("simxGetJointPosition", jointHandle, operationMode)
+
+    def simxGetJointForce(self, clientID, jointHandle, operationMode):
+        return self._read("simxGetJointForce", jointHandle, operationMode)
+
+    def simxGetVisionSensorImageNumpy(self, clientID, sensorHandle, options, operationMode, out=None):
+        return self._read("simxGetVisionSensorImageNumpy", sensorHandle, operationMode, out)
+
+    def simxGetVisionSensorDepthBufferNumpy(self, clientID, sensorHandle, operationMode, out=None):
+        return self._read("simxGetVisionSensorDepthBufferNumpy", sensorHandle, operationMode, out)
+
+    def _read(self, function, handle, operation_mode, out=None, relative_to=None):
+        record = None
+        if operation_mode & 0xff0000 not in (vc.simx_opmode_discontinue, vc.simx_opmode_remove):
+            record = self._lookup(function, handle, relative_to)
+        if record is None:
+            return (vc.simx_return_novalue_flag,) + self._NO_VALUE[function]
+        return (vc.simx_return_ok,) + tuple(
+            self._value(record, field, out) for field, _, _ in StreamRecorder.LAYOUTS[function])
+
+    @staticmethod
+    def _value(record, field, out):
+        value = record[field]
+        if field in ("image", "depth"):
+            # A copy, the log is read-only
+            if out is not None and out.size == value.size and out.dtype == value.dtype:
+                out[...] = value
+                return out
+            return np.array(value)
+        if value.ndim:
+            return value.tolist()
+        return value.item()
+
+    def _lookup(self, function, handle, relative_to=None):
+        segments = self._segments.get((function, handle, relative_to))
+        if segments is None:
+            return None
+        now = self.time()
+        run_start = self._run_start(now)
+        found, found_time = None, None
+        for timeline, records in segments:
+            i = np.searchsorted(timeline, now, side="right") - 1
+            # Readings of a previous run are not served
+            if i >= 0 and timeline[i] >= run_start and (found_time is None or timeline[i] > found_time):
+                found, found_time = records[i], timeline[i]
+        return found
+
+    def _proximity_group_data(self, operation_mode):
+        handles, int_data, float_data = [], [], []
+        for function, handle, _ in self._segments:
+            if function != "simxReadProximitySensor":
+                continue
+            record = self._lookup(function, handle)
+            if record is None:
+                return vc.simx_return_novalue_flag, [], [], [], []
+            handles.append(handle)
+            int_data += [int(record["state"]), int(record["object"])]
+            float_data += record["point"].tolist() + record["normal"].tolist()
+        return vc.simx_return_ok, handles, int_data, float_data, []
+
+    def _pose_group_data(self, operation_mode):
+        # Objects of which both the position and the orientation were recorded in the world frame
+        handles, float_data = [], []
+        for function, handle, relative_to in self._segments:
+            if function != "simxGetObjectPosition" or relative_to != -1 or \
+                    ("simxGetObjectOrientation", handle, -1) not in self._segments:
+                continue
+            position = self._lookup(function, handle, -1)
+            orientation = self._lookup("simxGetObjectOrientation", handle, -1)
+            if position is None or orientation is None:
+                return vc.simx_return_novalue_flag, [], [], [], []
+            handles.append(handle)
+            float_data += position["position"].tolist() + orientation["orientation"].tolist()
+        return vc.simx_return_ok, handles, [], float_data, []
+
+    def _names(self):
+        data = self._metadata["group_data"].get("{},0".format(vc.sim_appobj_object_type))
+        if data is None:
+            return {}
+        return dict(zip(data[3], data[0]))
+
+    def _pause(self):
+        self._position = self.time()
+        self._origin = None
+
+    def _run_start(self, now):
+        return self._run_starts[max(np.searchsorted(self._run_starts, now, side="right") - 1, 0)]
+
+    @staticmethod
+    def _recording_period(streams):
+        periods = [np.median(np.diff(stream.records["time"])) for stream in streams if len(stream) > 1]
+        periods = [period for period in periods if period > 0]
+        return float(min(periods)) if periods else 50.0
+
+    def _load_index(self, path, streams):
+        # The cache is valid for the same record counts, file sizes and modification times
+        key = np.array([[len(stream), os.path.getsize(stream.path), os.stat(stream.path).st_mtime_ns]
+                        if stream.path is not None and os.path.exists(stream.path) else [len(stream), -1, -1]
+                        for stream in streams], dtype=np.int64).reshape(-1, 3)
+        try:
+            with np.load(path) as index:
+                if np.array_equal(index["key"], key):
+                    return index["run_starts"], [index["timeline_" + str(i)] for i in range(len(streams))]
+        except (OSError, KeyError, ValueError):
+            # No cache yet, or one of another format
+            pass
+        run_starts, timelines = self._build_index(streams)
+        try:
+            with open(path, "wb") as index_file:
+                np.savez(index_file, key=key, run_starts=run_starts,
+                         **{"timeline_" + str(i): timeline for i, timeline in enumerate(timelines)})
+        except OSError:
+            # Read-only log: the index is only kept in memory
+            pass
+        return run_starts, timelines
+
+    @staticmethod
+    def _build_index(streams):
+        # A restart of the simulation happened between the wall times of the records
+        # where the simulation time of a stream goes back; the restarts seen by
+        # the streams are matched by intersecting these intervals
+        intervals = []
+        for stream in streams:
+            times = stream.records["time"]
+            walls = stream.records["wall"]
+            drops = np.flatnonzero(times[1:] < times[:-1]) + 1
+            intervals += [(walls[i - 1], walls[i]) for i in drops]
+        restarts = []
+        for low, high in sorted(intervals):
+            if restarts and low <= restarts[-1][1]:
+                restarts[-1] = (max(restarts[-1][0], low), min(restarts[-1][1], high))
+            else:
+                restarts.append((low, high))
+        boundaries = np.array([low for low, _ in restarts], dtype=np.float64)
+        runs = [np.searchsorted(boundaries, stream.records["wall"], side="right") for stream in streams]
+        lengths = np.zeros(len(boundaries) + 1, dtype=np.int64)
+        for stream, stream_runs in zip(streams, runs):
+            np.maximum.at(lengths, stream_runs, stream.records["time"].astype(np.int64))
+        # Runs are laid end to end, 1 ms apart
+        run_starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1])).astype(np.int64)
+        timelines = [run_starts[stream_runs] + stream.records["time"].astype(np.int64)
+                     for stream, stream_runs in zip(streams, runs)]
+        return run_starts, timelines
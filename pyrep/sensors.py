@@ -1,12 +1,15 @@
 import numpy as np
-from .vrep import vrep as v
 from .vrep import vrepConst as vc
-from .common import NotFoundComponentError, ReturnCommandError
+from .common import ReturnCommandError
 from .common import Coordinates, EulerAngles
+from . import transforms
+from .backend import Backend
+from .handles import HandleRegistry
 
 class ProximitySensor:
 
-    def __init__(self, client_id, handle):
+    def __init__(self, backend, client_id, handle):
+        self._backend = backend
         self._id = client_id
         self._handle = handle
 
@@ -18,7 +21,7 @@ class ProximitySensor:
         """
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
-        code, state, point, _, _ = v.simxReadProximitySensor(
+        code, state, point, _, _ = self._backend.simxReadProximitySensor(
             self._id, self._handle, op_mode)
         if code == vc.simx_return_ok:
             return state, Coordinates(point[0], point[1], point[2])
@@ -27,16 +30,91 @@ class ProximitySensor:
         raise ReturnCommandError(code)
 
 
+class SensorGroup:
+
+    """
+    Group of proximity sensors that are read in one pass.
+    With use_group_data, the data of all proximity sensors of the scene
+    is fetched in a single server reply and the members are picked from it.
+    """
+
+    # simxGetObjectGroupData data type of proximity sensor data:
+    # in intData (2 values): detection state, detected object handle
+    # in floatData (6 values): detected point, detected surface normal
+    _GROUP_DATA_TYPE = 13
+
+    def __init__(self, backend, client_id, handles, use_group_data=False):
+        self._backend = backend
+        self._id = client_id
+        self._handles = np.asarray(handles, dtype=np.int32)
+        self._use_group_data = use_group_data
+
+    def __len__(self):
+        return len(self._handles)
+
+    def read(self, op_mode=None) -> (np.ndarray, np.ndarray):
+        """
+        Reads the state of all proximity sensors of the group.
+        @return detection states and detected points, in the order of the group
+        @rtype (numpy array of N bool, numpy array of Nx3 float32)
+        """
+        if op_mode is None:
+            op_mode = vc.simx_opmode_streaming
+        if self._use_group_data:
+            return self._read_group_data(op_mode)
+        states = np.empty(len(self._handles), dtype=bool)
+        points = np.empty((len(self._handles), 3), dtype=np.float32)
+        has_value = True
+        # Every member is read even without a value, so all of them start streaming
+        for i, handle in enumerate(self._handles):
+            code, state, point, _, _ = self._backend.simxReadProximitySensor(
+                self._id, int(handle), op_mode)
+            if code == vc.simx_return_ok:
+                states[i] = state
+                points[i] = point
+            elif code == vc.simx_return_novalue_flag:
+                has_value = False
+            else:
+                raise ReturnCommandError(code)
+        if has_value:
+            return states, points
+        return None, None
+
+    def _read_group_data(self, op_mode):
+        code, handles, int_data, float_data, _ = self._backend.simxGetObjectGroupData(
+            self._id, vc.sim_object_proximitysensor_type, self._GROUP_DATA_TYPE, op_mode)
+        if code == vc.simx_return_ok:
+            handles = np.asarray(handles, dtype=np.int32)
+            int_data = np.asarray(int_data, dtype=np.int32).reshape(-1, 2)
+            float_data = np.asarray(float_data, dtype=np.float32).reshape(-1, 6)
+            order = np.argsort(handles)
+            positions = np.searchsorted(handles, self._handles, sorter=order)
+            if np.any(positions == len(handles)) or \
+                    np.any(handles[order[positions]] != self._handles):
+                # A member of the group is not a proximity sensor of the scene anymore
+                raise ReturnCommandError(vc.simx_return_remote_error_flag)
+            index = order[positions]
+            return int_data[index, 0] != 0, float_data[index, :3]
+        elif code == vc.simx_return_novalue_flag:
+            return None, None
+        raise ReturnCommandError(code)
+
+
 class VisionSensor:
 
-    def __init__(self, client_id, handle):
+    def __init__(self, backend, client_id, handle):
+        self._backend = backend
         self._id = client_id
         self._handle = handle
+        self._clipping_planes = None
+        self._ring_size = 0
+        self._ring = []
+        self._ring_index = 0
 
     def read(self, op_mode=None):
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
-        code, state, aux_packets = v.simxReadVisionSensor(
+        code, state, aux_packets = self._backend.simxReadVisionSensor(
             self._id, self._handle, op_mode)
         if code == vc.simx_return_ok:
             return state, aux_packets
@@ -44,6 +122,23 @@ class VisionSensor:
             return None, None
         raise ReturnCommandError(code)
 
+    def enable_frame_ring(self, size=3):
+        """
+        Makes raw_image fill a ring of preallocated frames in place
+        instead of allocating a new array per call.
+        A returned image is overwritten after size more calls.
+        """
+        if size < 1:
+            raise ValueError("Frame ring size must be positive: " + str(size))
+        self._ring_size = size
+        self._ring = []
+        self._ring_index = 0
+
+    def disable_frame_ring(self):
+        self._ring_size = 0
+        self._ring = []
+        self._ring_index = 0
+
     def raw_image(self, is_grey_scale=False, op_mode=None):
         """
         Retrieves the image of a vision sensor.
@@ -51,37 +146,77 @@ class VisionSensor:
         """
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
-        code, resolution, image_flat = v.simxGetVisionSensorImage(
-            self._id, self._handle, int(is_grey_scale), op_mode)
+        frame = self._ring[self._ring_index] if self._ring else None
+        code, resolution, image_flat = self._backend.simxGetVisionSensorImageNumpy(
+            self._id, self._handle, int(is_grey_scale), op_mode, frame)
         if code == vc.simx_return_ok:
-            image_flat = np.asarray(image_flat, dtype=np.uint8)
+            if self._ring_size:
+                self._store_in_ring(image_flat, frame)
+            shape = (resolution[1], resolution[0])
             if not is_grey_scale:
-                resolution.append(3)
-            image = image_flat.reshape(tuple(resolution))
+                shape += (3,)
+            image = image_flat.reshape(shape)
             image = np.rot90(image, 2)
             return image
         elif code == vc.simx_return_novalue_flag:
             return None
         raise ReturnCommandError(code)
 
-    def depth_buffer(self, op_mode=None):
+    def _store_in_ring(self, image_flat, frame):
+        if image_flat is not frame:
+            # First frame, or the resolution / color mode has changed
+            self._ring = [image_flat]
+            self._ring += [np.empty_like(image_flat) for _ in range(self._ring_size - 1)]
+            self._ring_index = 0
+        self._ring_index = (self._ring_index + 1) % self._ring_size
+
+    def depth_buffer(self, op_mode=None, metric=False):
         """
         Retrieves the depth buffer of a vision sensor.
+        Values are in range [0, 1] between the near and far clipping planes,
+        or distances in meters if metric is True.
+        @return the depth buffer as a float32 numpy array, oriented like raw_image
         """
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
-        code, resolution, buffer = v.simxGetVisionSensorDepthBuffer(
+        code, resolution, buffer = self._backend.simxGetVisionSensorDepthBufferNumpy(
             self._id, self._handle, op_mode)
         if code == vc.simx_return_ok:
-            return buffer
+            depth = buffer.reshape((resolution[1], resolution[0]))
+            if metric:
+                near, far = self.clipping_planes()
+                depth *= far - near
+                depth += near
+            depth = np.rot90(depth, 2)
+            return depth
         elif code == vc.simx_return_novalue_flag:
             return None
         raise ReturnCommandError(code)
 
+    def clipping_planes(self):
+        """
+        Retrieves the near and far clipping planes of a vision sensor.
+        The values are read once and cached.
+        @rtype (float, float)
+        """
+        if self._clipping_planes is None:
+            near = self._get_float_parameter(vc.sim_visionfloatparam_near_clipping)
+            far = self._get_float_parameter(vc.sim_visionfloatparam_far_clipping)
+            self._clipping_planes = (near, far)
+        return self._clipping_planes
+
+    def _get_float_parameter(self, parameter_id):
+        code, value = self._backend.simxGetObjectFloatParameter(
+            self._id, self._handle, parameter_id, vc.simx_opmode_oneshot_wait)
+        if code == vc.simx_return_ok:
+            return value
+        raise ReturnCommandError(code)
+
 
 class ForceSensor:
 
-    def __init__(self, client_id, handle):
+    def __init__(self, backend, client_id, handle):
+        self._backend = backend
         self._id = client_id
         self._handle = handle
 
@@ -92,7 +227,7 @@ class ForceSensor:
         """
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
-        code, state, force, torque = v.simxReadForceSensor(
+        code, state, force, torque = self._backend.simxReadForceSensor(
             self._id, self._handle, op_mode)
         force_vector = Coordinates(force[0], force[1], force[2])
         torque_vector = Coordinates(torque[0], torque[1], torque[2])
@@ -105,7 +240,12 @@ class ForceSensor:
 
 class GroundTruthSensor:
 
-    def __init__(self, client_id, handle):
+    # simxGetObjectGroupData data type of absolute poses:
+    # in floatData (6 values): position, Euler angles
+    _POSE_DATA_TYPE = 9
+
+    def __init__(self, backend, client_id, handle):
+        self._backend = backend
         self._id = client_id
         self._handle = handle
 
@@ -115,7 +255,7 @@ class GroundTruthSensor:
         """
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
-        code, pos = v.simxGetObjectPosition(self._id, self._handle, -1, op_mode)
+        code, pos = self._backend.simxGetObjectPosition(self._id, self._handle, -1, op_mode)
         if code == vc.simx_return_ok:
             return Coordinates(pos[0], pos[1], pos[2])
         elif code == vc.simx_return_novalue_flag:
@@ -129,13 +269,50 @@ class GroundTruthSensor:
         """
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
-        code, orient = v.simxGetObjectOrientation(self._id, self._handle, -1, op_mode)
+        code, orient = self._backend.simxGetObjectOrientation(self._id, self._handle, -1, op_mode)
         if code == vc.simx_return_ok:
             return EulerAngles(orient[0], orient[1], orient[2])
         elif code == vc.simx_return_novalue_flag:
             return None
         raise ReturnCommandError(code)
 
+    def get_quaternion(self, op_mode=None) -> np.ndarray:
+        """
+        Retrieves the orientation as a quaternion.
+        @return x, y, z, w as a float64 numpy array
+        """
+        if op_mode is None:
+            op_mode = vc.simx_opmode_streaming
+        code, quaternion = self._backend.simxGetObjectQuaternion(self._id, self._handle, -1, op_mode)
+        if code == vc.simx_return_ok:
+            return np.asarray(quaternion, dtype=np.float64)
+        elif code == vc.simx_return_novalue_flag:
+            return None
+        raise ReturnCommandError(code)
+
+    def get_pose(self, op_mode=None) -> np.ndarray:
+        """
+        Retrieves the position and the orientation in one reply
+        (the poses of all objects of the scene, from which this one is picked).
+        @return the 4x4 homogeneous transform of the object in the world frame
+        @rtype numpy array of 4x4 float64
+        """
+        if op_mode is None:
+            op_mode = vc.simx_opmode_streaming
+        code, handles, _, float_data, _ = self._backend.simxGetObjectGroupData(
+            self._id, vc.sim_appobj_object_type, self._POSE_DATA_TYPE, op_mode)
+        if code == vc.simx_return_ok:
+            try:
+                index = list(handles).index(self._handle)
+            except ValueError:
+                # The object is not in the scene anymore
+                raise ReturnCommandError(vc.simx_return_remote_error_flag)
+            values = np.asarray(float_data[6 * index:6 * index + 6], dtype=np.float64)
+            return transforms.pose(values[:3], transforms.euler_to_matrix(values[3:]))
+        elif code == vc.simx_return_novalue_flag:
+            return None
+        raise ReturnCommandError(code)
+
     def get_velocity(self, op_mode=None) -> (Coordinates, EulerAngles):
         """
         Retrieves the linear and angular velocity.
@@ -143,7 +320,7 @@ class GroundTruthSensor:
         """
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
-        code, lin_vel, ang_vel = v.simxGetObjectVelocity(self._id, self._handle, op_mode)
+        code, lin_vel, ang_vel = self._backend.simxGetObjectVelocity(self._id, self._handle, op_mode)
         linear_velocity = Coordinates(lin_vel[0], lin_vel[1], lin_vel[2])
         angular_velocity = EulerAngles(ang_vel[0], ang_vel[1], ang_vel[2])
         if code == vc.simx_return_ok:
@@ -163,7 +340,8 @@ class LaserScanner2d:
     simSetStringSignal("LaserScanner2dData", data)
     """
 
-    def __init__(self, client_id, handle, signal_name=None):
+    def __init__(self, backend, client_id, handle, signal_name=None):
+        self._backend = backend
         self._id = client_id
         self._handle = handle
         if signal_name is not None:
@@ -171,48 +349,105 @@ class LaserScanner2d:
         else:
             self._signal_name = "LaserScanner2dData"
 
-    def read(self, op_mode=None):
+    def read(self, op_mode=None) -> np.ndarray:
+        """
+        Reads the points of the last scan.
+        @return the points as a Nx3 float32 numpy array
+        """
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
-        code, signal = v.simxGetStringSignal(self._id, self._signal_name, op_mode)
+        code, signal = self._backend.simxGetStringSignal(
+            self._id, self._signal_name, op_mode, copy=False)
         if code == vc.simx_return_ok:
-            readings = v.simxUnpackFloats(signal)
-            points = []
-            for i in range(0, len(readings), 3):
-                points.append(Coordinates(readings[i], readings[i+1], readings[i+2]))
-            return points
+            readings = np.frombuffer(signal, dtype='<f4', count=len(signal) // 4)
+            readings = readings[:len(readings) - len(readings) % 3]
+            # The signal is a view of the reply buffer, copy it before the next call
+            return readings.reshape(-1, 3).copy()
         elif code == vc.simx_return_novalue_flag:
             return None
         raise ReturnCommandError(code)
 
+    def read_polar(self, op_mode=None) -> (np.ndarray, np.ndarray):
+        """
+        Reads the last scan in polar form.
+        @return ranges and angles of the points
+        @rtype (numpy array of N float32, numpy array of N float32)
+        """
+        points = self.read(op_mode)
+        if points is None:
+            return None, None
+        return self.to_polar(points)
+
+    @staticmethod
+    def to_polar(points: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Converts points to ranges and angles in the xy plane of their frame.
+        """
+        ranges = np.hypot(points[:, 0], points[:, 1])
+        angles = np.arctan2(points[:, 1], points[:, 0])
+        return ranges, angles
+
+    @staticmethod
+    def to_range_image(points: np.ndarray, bins: int,
+                       min_angle=-np.pi, max_angle=np.pi) -> np.ndarray:
+        """
+        Converts points to a fixed-size range image: the angular range is split
+        into bins, each one holding the closest range in it (inf if empty).
+        """
+        ranges, angles = LaserScanner2d.to_polar(points)
+        inside = (angles >= min_angle) & (angles <= max_angle)
+        index = np.floor((angles[inside] - min_angle) * (bins / (max_angle - min_angle)))
+        index = np.minimum(index.astype(np.intp), bins - 1)
+        image = np.full(bins, np.inf, dtype=np.float32)
+        np.minimum.at(image, index, ranges[inside])
+        return image
+
+    @staticmethod
+    def voxel_downsample(points: np.ndarray, voxel_size: float) -> np.ndarray:
+        """
+        Replaces the points falling in the same cubic voxel by their centroid.
+        """
+        if len(points) == 0:
+            return points.copy()
+        voxels = np.floor(points / voxel_size).astype(np.int64)
+        _, inverse, counts = np.unique(voxels, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        centroids = np.zeros((len(counts), points.shape[1]), dtype=np.float64)
+        np.add.at(centroids, inverse, points)
+        centroids /= counts[:, np.newaxis]
+        return centroids.astype(points.dtype)
+
 
 class Sensors:
 
-    def __init__(self, client_id):
+    def __init__(self, backend: Backend, client_id, handles: HandleRegistry):
+        self._backend = backend
         self._id = client_id
+        self._handles = handles
 
     def proximity(self, name: str) -> ProximitySensor:
         handle = self._get_object_handle(name)
-        return ProximitySensor(self._id, handle)
+        return ProximitySensor(self._backend, self._id, handle)
+
+    def proximity_group(self, names, use_group_data=False) -> SensorGroup:
+        handles = [self._get_object_handle(name) for name in names]
+        return SensorGroup(self._backend, self._id, handles, use_group_data)
 
     def ground_truth(self, name: str) -> GroundTruthSensor:
         handle = self._get_object_handle(name)
-        return GroundTruthSensor(self._id, handle)
+        return GroundTruthSensor(self._backend, self._id, handle)
 
     def vision(self, name: str) -> VisionSensor:
         handle = self._get_object_handle(name)
-        return VisionSensor(self._id, handle)
+        return VisionSensor(self._backend, self._id, handle)
 
     def force(self, name: str) -> ForceSensor:
         handle = self._get_object_handle(name)
-        return ForceSensor(self._id, handle)
+        return ForceSensor(self._backend, self._id, handle)
 
     def laser_scanner_2d(self, name: str, signal_name: str=None):
         handle = self._get_object_handle(name)
-        return LaserScanner2d(self._id, handle, signal_name)
+        return LaserScanner2d(self._backend, self._id, handle, signal_name)
 
     def _get_object_handle(self, name):
-        code, handle = v.simxGetObjectHandle(self._id, name, vc.simx_opmode_oneshot_wait)
-        if code == v.simx_return_ok:
-            return handle
-        raise NotFoundComponentError(name, code)
+        return self._handles.get(name)
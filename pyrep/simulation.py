@@ -1,56 +1,135 @@
-from .vrep import vrep as v
+import time
+from contextlib import contextmanager
 from .vrep import vrepConst as vc
+from .backend import Backend
 from .common import ReturnCommandError
 
 class Simulation:
 
-    def __init__(self, client_id):
+    def __init__(self, backend: Backend, client_id):
+        self._backend = backend
         self._id = client_id
+        self._batch_depth = 0
 
     def start(self):
-        code = v.simxStartSimulation(self._id, vc.simx_opmode_oneshot_wait)
-        if code not in (v.simx_return_ok, v.simx_return_novalue_flag):
+        code = self._backend.simxStartSimulation(self._id, vc.simx_opmode_oneshot_wait)
+        if code not in (vc.simx_return_ok, vc.simx_return_novalue_flag):
             raise ReturnCommandError(code)
 
     def resume(self):
-        code = v.simxPauseSimulation(self._id, vc.simx_opmode_oneshot_wait)
-        if code not in (v.simx_return_ok, v.simx_return_novalue_flag):
+        code = self._backend.simxPauseSimulation(self._id, vc.simx_opmode_oneshot_wait)
+        if code not in (vc.simx_return_ok, vc.simx_return_novalue_flag):
             raise ReturnCommandError(code)
 
     def pause(self):
-        code = v.simxPauseSimulation(self._id, vc.simx_opmode_oneshot_wait)
-        if code not in (v.simx_return_ok, v.simx_return_novalue_flag):
+        code = self._backend.simxPauseSimulation(self._id, vc.simx_opmode_oneshot_wait)
+        if code not in (vc.simx_return_ok, vc.simx_return_novalue_flag):
             raise ReturnCommandError(code)
 
     def stop(self):
-        code = v.simxStopSimulation(self._id, vc.simx_opmode_oneshot_wait)
-        if code not in (v.simx_return_ok, v.simx_return_novalue_flag):
+        code = self._backend.simxStopSimulation(self._id, vc.simx_opmode_oneshot_wait)
+        if code not in (vc.simx_return_ok, vc.simx_return_novalue_flag):
             raise ReturnCommandError(code)
 
+    def set_synchronous(self, enable: bool):
+        """
+        Enables or disables the synchronous mode, in which the simulation
+        only advances when step() is called.
+        Should be enabled before the simulation starts.
+        """
+        code = self._backend.simxSynchronous(self._id, enable)
+        if code != vc.simx_return_ok:
+            raise ReturnCommandError(code)
+
+    @contextmanager
+    def synchronous(self):
+        """
+        Runs the body of the with statement in synchronous mode.
+        """
+        self.set_synchronous(True)
+        try:
+            yield self
+        finally:
+            self.set_synchronous(False)
+
+    def step(self, steps=1):
+        """
+        Advances the simulation by the given number of steps (synchronous mode)
+        and blocks until the last step has been computed.
+        """
+        for _ in range(steps):
+            code = self._backend.simxSynchronousTrigger(self._id)
+            if code != vc.simx_return_ok:
+                raise ReturnCommandError(code)
+            # The ping reply is sent once the triggered step is done
+            self.ping_time()
+
     def resume_communication(self):
-        code = v.simxPauseCommunication(self._id, False)
+        code = self._backend.simxPauseCommunication(self._id, False)
         if code != vc.simx_return_ok:
             raise ReturnCommandError(code)
 
     def pause_communication(self):
-        code = v.simxPauseCommunication(self._id, True)
+        code = self._backend.simxPauseCommunication(self._id, True)
         if code != vc.simx_return_ok:
             raise ReturnCommandError(code)
 
+    @contextmanager
+    def batch(self):
+        """
+        Holds back the commands issued in the body of the with statement
+        and sends them in one packet at its end, so they are applied
+        on the same simulation step. Batches can be nested.
+        """
+        if self._batch_depth == 0:
+            self.pause_communication()
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.resume_communication()
+
     def ping_time(self):
-        code, time = v.simxGetPingTime(self._id)
+        code, time = self._backend.simxGetPingTime(self._id)
         if code == vc.simx_return_ok:
             return time
         raise ReturnCommandError(code)
 
+    def is_running(self):
+        """
+        Whether the simulation was running (not stopped, possibly paused)
+        in the last message received from the server.
+        @return None if no message has been received yet
+        """
+        code, state = self._backend.simxGetInMessageInfo(self._id, vc.simx_headeroffset_server_state)
+        if code == -1:
+            return None
+        return state & 1 != 0
+
+    def wait_stopped(self, timeout=5.0):
+        """
+        Blocks until the server reports the simulation as stopped: stopping
+        takes several simulation passes, during which a start is ignored.
+        """
+        deadline = time.monotonic() + timeout
+        # A round-trip, so the state comes from a message sent after the call
+        self.ping_time()
+        while self.is_running() is not False:
+            if time.monotonic() > deadline:
+                raise ReturnCommandError(vc.simx_return_timeout_flag)
+            time.sleep(0.005)
+            self.ping_time()
+
     def last_cmd_time(self):
-        time = v.simxGetLastCmdTime(self._id)
+        time = self._backend.simxGetLastCmdTime(self._id)
         return time
 
     def get_float_signal(self, signal_name, op_mode=None):
         if op_mode is None:
             op_mode = vc.simx_opmode_streaming
-        code, signal = v.simxGetFloatSignal(self._id, signal_name, op_mode)
+        code, signal = self._backend.simxGetFloatSignal(self._id, signal_name, op_mode)
         if code == vc.simx_return_ok:
             return signal
         elif code == vc.simx_return_novalue_flag:
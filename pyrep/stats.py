@@ -0,0 +1,216 @@
+import bisect
+import threading
+import time
+import numpy as np
+from .vrep import vrepConst as vc
+from .backend import Backend
+
+
+class CallStats:
+
+    """
+    Statistics of the remote API calls of a connection: call counts,
+    latency histograms by operation mode, return code counters and
+    approximate payload bytes (4 bytes per int or float, buffers by length).
+    The bytes received only count the values of successful replies, and
+    the bytes sent only the data arguments (values set, matrices,
+    scene paths), not the handles, names and operation modes of the calls.
+    """
+
+    # Upper bounds (in seconds) of the latency histogram buckets, the last one is unbounded
+    LATENCY_BUCKETS = (1e-5, 3e-5, 1e-4, 3e-4, 1e-3, 3e-3, 1e-2, 3e-2, 1e-1, 3e-1, 1.0, float("inf"))
+
+    OPERATION_MODES = {
+        vc.simx_opmode_oneshot: "oneshot",
+        vc.simx_opmode_oneshot_wait: "oneshot_wait",
+        vc.simx_opmode_streaming: "streaming",
+        vc.simx_opmode_oneshot_split: "oneshot_split",
+        vc.simx_opmode_streaming_split: "streaming_split",
+        vc.simx_opmode_discontinue: "discontinue",
+        vc.simx_opmode_buffer: "buffer",
+        vc.simx_opmode_remove: "remove",
+    }
+
+    RETURN_FLAGS = (
+        (vc.simx_return_novalue_flag, "novalue"),
+        (vc.simx_return_timeout_flag, "timeout"),
+        (vc.simx_return_illegal_opmode_flag, "illegal_opmode"),
+        (vc.simx_return_remote_error_flag, "remote_error"),
+        (vc.simx_return_split_progress_flag, "split_progress"),
+        (vc.simx_return_local_error_flag, "local_error"),
+        (vc.simx_return_initialize_error_flag, "initialize_error"),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._functions = {}
+
+    def record(self, function: str, op_mode, seconds: float, code, bytes_sent: int, bytes_received: int):
+        """
+        Adds a call of function, made with op_mode (None if the function has none)
+        and returning code (None if it returns no code).
+        """
+        mode = "none" if op_mode is None else self.OPERATION_MODES.get(op_mode & 0xff0000, "unknown")
+        bucket = bisect.bisect_left(self.LATENCY_BUCKETS, seconds)
+        with self._lock:
+            entry = self._functions.get(function)
+            if entry is None:
+                entry = self._functions[function] = {
+                    "calls": 0, "bytes_sent": 0, "bytes_received": 0, "return_codes": {}, "op_modes": {}}
+            entry["calls"] += 1
+            entry["bytes_sent"] += bytes_sent
+            entry["bytes_received"] += bytes_received
+            if code is not None:
+                codes = entry["return_codes"]
+                for name in self._code_names(code):
+                    codes[name] = codes.get(name, 0) + 1
+            latency = entry["op_modes"].get(mode)
+            if latency is None:
+                latency = entry["op_modes"][mode] = {
+                    "calls": 0, "total_s": 0.0, "min_s": seconds, "max_s": seconds,
+                    "histogram": [0] * len(self.LATENCY_BUCKETS)}
+            latency["calls"] += 1
+            latency["total_s"] += seconds
+            latency["min_s"] = min(latency["min_s"], seconds)
+            latency["max_s"] = max(latency["max_s"], seconds)
+            latency["histogram"][bucket] += 1
+
+    def snapshot(self) -> dict:
+        """
+        @return statistics by function name:
+        {"calls", "bytes_sent", "bytes_received",
+         "return_codes": {"ok" or flag name: count},
+         "op_modes": {mode name: {"calls", "total_s", "min_s", "max_s",
+                                  "histogram": {bucket upper bound: count}}}}
+        """
+        with self._lock:
+            result = {}
+            for function, entry in self._functions.items():
+                result[function] = dict(
+                    entry,
+                    return_codes=dict(entry["return_codes"]),
+                    op_modes={mode: dict(latency, histogram=dict(zip(self.LATENCY_BUCKETS, latency["histogram"])))
+                              for mode, latency in entry["op_modes"].items()})
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._functions = {}
+
+    def _code_names(self, code):
+        if code == vc.simx_return_ok:
+            return ("ok",)
+        return tuple(name for flag, name in self.RETURN_FLAGS if code & flag)
+
+
+class InstrumentedBackend(Backend):
+
+    """
+    Backend recording the calls made to another backend in a CallStats.
+    Other attributes of the wrapped backend are passed through.
+    """
+
+    # Position of the operationMode argument of the functions having one
+    _OP_MODE_ARGUMENT = {
+        "simxStartSimulation": 1,
+        "simxPauseSimulation": 1,
+        "simxStopSimulation": 1,
+        "simxGetFloatSignal": 2,
+        "simxGetStringSignal": 2,
+        "simxGetObjectHandle": 2,
+        "simxGetObjectVelocity": 2,
+        "simxGetJointForce": 2,
+        "simxGetJointMatrix": 2,
+        "simxGetJointPosition": 2,
+        "simxReadProximitySensor": 2,
+        "simxReadForceSensor": 2,
+        "simxReadVisionSensor": 2,
+        "simxGetVisionSensorDepthBufferNumpy": 2,
+        "simxLoadScene": 3,
+        "simxGetObjectGroupData": 3,
+        "simxGetObjectFloatParameter": 3,
+        "simxGetObjectPosition": 3,
+        "simxGetObjectOrientation": 3,
+        "simxGetObjectQuaternion": 3,
+        "simxSetJointForce": 3,
+        "simxSetJointPosition": 3,
+        "simxSetJointTargetPosition": 3,
+        "simxSetJointTargetVelocity": 3,
+        "simxSetSphericalJointMatrix": 3,
+        "simxGetVisionSensorImageNumpy": 3,
+    }
+
+    # Data arguments of the functions sending values: position and name
+    _DATA_ARGUMENT = {
+        "simxLoadScene": (1, "scenePathAndName"),
+        "simxSetJointForce": (2, "force"),
+        "simxSetJointPosition": (2, "position"),
+        "simxSetJointTargetPosition": (2, "targetPosition"),
+        "simxSetJointTargetVelocity": (2, "targetVelocity"),
+        "simxSetSphericalJointMatrix": (2, "matrix"),
+    }
+
+    # Functions whose return value is not (or does not start with) a return code
+    # (simxGetInMessageInfo returns 1 or -1)
+    _NO_RETURN_CODE = ("simxStart", "simxFinish", "simxGetLastCmdTime", "simxGetInMessageInfo")
+
+    def __init__(self, backend: Backend, stats: CallStats=None):
+        self._backend = backend
+        self.stats = CallStats() if stats is None else stats
+        for name in self.FUNCTIONS:
+            setattr(self, name, self._instrument(name))
+
+    def __getattr__(self, name):
+        return getattr(self._backend, name)
+
+    def _instrument(self, name):
+        stats = self.stats
+        backend = self._backend
+        op_mode_argument = self._OP_MODE_ARGUMENT.get(name)
+        data_argument = self._DATA_ARGUMENT.get(name)
+        has_code = name not in self._NO_RETURN_CODE
+        clock = time.perf_counter
+
+        def call(*args, **kwargs):
+            # Resolved on each call, so functions replaced on the wrapped backend are used
+            function = getattr(backend, name)
+            start = clock()
+            result = function(*args, **kwargs)
+            seconds = clock() - start
+            if op_mode_argument is None:
+                op_mode = None
+            elif len(args) > op_mode_argument:
+                op_mode = args[op_mode_argument]
+            else:
+                op_mode = kwargs.get("operationMode")
+            code = None
+            if has_code:
+                code = result[0] if isinstance(result, tuple) else result
+            sent = 0
+            if data_argument is not None:
+                position, keyword = data_argument
+                sent = _payload_size(args[position] if len(args) > position else kwargs.get(keyword))
+            received = 0
+            if code == vc.simx_return_ok and isinstance(result, tuple):
+                received = _payload_size(result[1:])
+            elif not has_code:
+                received = _payload_size(result)
+            stats.record(name, op_mode, seconds, code, sent, received)
+            return result
+
+        call.__name__ = name
+        return call
+
+
+def _payload_size(value) -> int:
+    if isinstance(value, (tuple, list)):
+        if value and isinstance(value[0], (int, float)) and not isinstance(value[0], bool):
+            return 4 * len(value)
+        return sum(_payload_size(item) for item in value)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, (int, float)):
+        return 4
+    return 0
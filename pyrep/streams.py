@@ -0,0 +1,145 @@
+import functools
+import time
+from .vrep import vrepConst as vc
+
+
+class Subscription:
+
+    """
+    Command streamed by the server, e.g. the readings of a sensor.
+    Streaming is requested once, then read() only looks up the last reply
+    in the client input buffer, without sending anything.
+    """
+
+    def __init__(self, registry, key, getter):
+        self._registry = registry
+        self._key = key
+        self._getter = getter
+        self._count = 0
+        self._ready = False
+
+    @property
+    def active(self) -> bool:
+        return self._count > 0
+
+    def read(self):
+        """
+        Reads the last streamed value, with the return value of the getter:
+        None (or a tuple of None) until the first reply has arrived.
+        """
+        value = self._getter(op_mode=vc.simx_opmode_buffer)
+        if not self._ready:
+            self._ready = _has_value(value)
+        return value
+
+    def is_ready(self) -> bool:
+        if not self._ready:
+            self.read()
+        return self._ready
+
+    def wait_ready(self, timeout=1.0) -> bool:
+        """
+        Blocks until the first value has arrived, or timeout seconds.
+        @return whether a value is available
+        """
+        deadline = time.monotonic() + timeout
+        delay = 0.001
+        while not self.is_ready():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            # Reading the input buffer is cheap, so it is polled at the pace of the communication thread
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.01)
+        return True
+
+    def unsubscribe(self):
+        """
+        Stops the streaming once every subscriber of the command has unsubscribed.
+        """
+        self._registry._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.unsubscribe()
+
+
+class StreamRegistry:
+
+    """
+    Subscriptions of a connection, one per streamed command:
+    subscribing twice to the same command of the same object shares
+    the stream, which is discontinued when the last subscriber leaves.
+    """
+
+    def __init__(self):
+        self._subscriptions = {}
+
+    def subscribe(self, getter) -> Subscription:
+        """
+        Starts streaming the value returned by getter, a bound getter
+        of a component taking an op_mode argument (e.g. sensor.read),
+        or a functools.partial of one fixing other arguments.
+        @rtype Subscription
+        """
+        key = _stream_key(getter)
+        subscription = self._subscriptions.get(key)
+        if subscription is None:
+            subscription = Subscription(self, key, getter)
+            self._subscriptions[key] = subscription
+            subscription._ready = _has_value(getter(op_mode=vc.simx_opmode_streaming))
+        subscription._count += 1
+        return subscription
+
+    def wait_ready(self, timeout=1.0) -> bool:
+        """
+        Blocks until all subscriptions have a value, or timeout seconds.
+        @return whether all of them have a value
+        """
+        deadline = time.monotonic() + timeout
+        for subscription in list(self._subscriptions.values()):
+            if not subscription.wait_ready(max(deadline - time.monotonic(), 0)):
+                return False
+        return True
+
+    def reset_ready(self):
+        """
+        Marks all subscriptions as waiting for a value again, e.g. after a
+        simulation restart, so wait_ready checks the streams once more.
+        """
+        for subscription in self._subscriptions.values():
+            subscription._ready = False
+
+    def unsubscribe_all(self):
+        for subscription in list(self._subscriptions.values()):
+            subscription._count = 1
+            self._release(subscription)
+
+    def _release(self, subscription):
+        if subscription._count == 0:
+            return
+        subscription._count -= 1
+        if subscription._count == 0:
+            del self._subscriptions[subscription._key]
+            subscription._ready = False
+            subscription._getter(op_mode=vc.simx_opmode_discontinue)
+
+
+def _stream_key(getter):
+    if isinstance(getter, functools.partial):
+        return _stream_key(getter.func) + (getter.args, tuple(sorted(getter.keywords.items())))
+    owner = getter.__self__
+    # Joint wrappers stream the commands of their AnyJoint
+    owner = getattr(owner, "_any_joint", owner)
+    handle = getattr(owner, "_handle", None)
+    if handle is None:
+        return id(owner), getter.__name__
+    return type(owner).__name__, handle, getattr(owner, "_signal_name", None), getter.__name__
+
+
+def _has_value(value):
+    if isinstance(value, tuple):
+        return len(value) > 0 and value[0] is not None
+    return value is not None
@@ -0,0 +1,226 @@
+import os
+import queue
+import threading
+import time
+import numpy as np
+from .common import Coordinates, EulerAngles
+
+
+class TelemetryExporter:
+
+    """
+    Columnar export of run telemetry: samples of named columns are buffered
+    in preallocated numpy chunks, written by a background thread as
+    chunk_NNNNN.npz files (one array per column) or, with format "parquet",
+    as row groups of telemetry.parquet (needs pyarrow).
+    Memory is bounded by the number of chunk buffers: if the writer falls
+    behind and all of them are full, samples are dropped (counted in
+    dropped_samples) rather than blocking the caller, unless block is set.
+    """
+
+    FORMATS = ("npz", "parquet")
+
+    def __init__(self, directory: str, chunk_size=4096, buffers=4, format="npz", block=False):
+        """
+        @param chunk_size samples per chunk
+        @param buffers chunk buffers allocated, one being filled and the others written
+        """
+        if format not in self.FORMATS:
+            raise ValueError("Unknown format: " + str(format))
+        if buffers < 2:
+            raise ValueError("At least 2 buffers are needed: " + str(buffers))
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.dropped_samples = 0
+        self.written_samples = 0
+        self._chunk_size = chunk_size
+        self._buffers = buffers
+        self._block = block
+        self._writer = _ParquetWriter(directory) if format == "parquet" else _NpzWriter(directory)
+        self._sources = {}
+        self._columns = None
+        self._chunk = None
+        self._count = 0
+        self._free = queue.Queue()
+        self._pending = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._write_chunks, daemon=True)
+        self._thread.start()
+
+    def add_source(self, name: str, getter):
+        """
+        Makes sample() read getter (called without arguments, e.g. a bound
+        component getter) into the column name.
+        Coordinates and EulerAngles are stored as 3 values, and the parts of
+        a tuple (e.g. the states and points of SensorGroup.read) in the
+        columns name.0, name.1...
+        """
+        if self._columns is not None:
+            raise ValueError("Sources must be added before the first sample")
+        self._sources[name] = getter
+
+    def sample(self, timestamp=None) -> bool:
+        """
+        Reads all sources and appends their values, with the column "time"
+        (timestamp, the wall clock time if None).
+        A sample in which a source has no value yet is not appended.
+        @return whether the sample was appended
+        """
+        values = {"time": time.time() if timestamp is None else timestamp}
+        for name, getter in self._sources.items():
+            value = getter()
+            if isinstance(value, tuple):
+                for i, part in enumerate(value):
+                    values[name + "." + str(i)] = part
+            else:
+                values[name] = value
+        if any(value is None for value in values.values()):
+            return False
+        self.append(values)
+        return True
+
+    def append(self, values: dict):
+        """
+        Appends a sample: values of the columns, all given in every sample.
+        The columns and their dtypes and shapes are set by the first sample.
+        """
+        if self._error is not None:
+            raise RuntimeError("Telemetry writer failed") from self._error
+        if self._columns is None:
+            self._allocate({name: _as_array(value) for name, value in values.items()})
+        if self._chunk is None:
+            self._chunk = self._next_buffer()
+            if self._chunk is None:
+                self.dropped_samples += 1
+                return
+        i = self._count
+        for name, column in self._chunk.items():
+            column[i] = _as_array(values[name])
+        self._count += 1
+        if self._count == self._chunk_size:
+            self._pending.put((self._chunk, self._count))
+            self._chunk = None
+            self._count = 0
+
+    def flush(self):
+        """
+        Hands the samples buffered so far to the writer and waits until all are written.
+        """
+        if self._chunk is not None and self._count:
+            self._pending.put((self._chunk, self._count))
+            self._chunk = None
+            self._count = 0
+        self._pending.join()
+        if self._error is not None:
+            raise RuntimeError("Telemetry writer failed") from self._error
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._pending.put(None)
+            self._thread.join()
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _allocate(self, first):
+        self._columns = {name: (value.dtype, value.shape) for name, value in first.items()}
+        for _ in range(self._buffers):
+            self._free.put({name: np.empty((self._chunk_size,) + shape, dtype=dtype)
+                            for name, (dtype, shape) in self._columns.items()})
+
+    def _next_buffer(self):
+        try:
+            return self._free.get(block=self._block)
+        except queue.Empty:
+            return None
+
+    def _write_chunks(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                self._pending.task_done()
+                return
+            chunk, count = item
+            try:
+                if self._error is None:
+                    self._writer.write({name: column[:count] for name, column in chunk.items()})
+                    self.written_samples += count
+            except Exception as error:
+                self._error = error
+            finally:
+                self._free.put(chunk)
+                self._pending.task_done()
+
+
+def read_npz_telemetry(directory: str) -> dict:
+    """
+    Concatenates the chunks written by a TelemetryExporter in npz format.
+    @return arrays by column name
+    """
+    names = sorted(name for name in os.listdir(directory) if name.startswith("chunk_") and name.endswith(".npz"))
+    chunks = []
+    for name in names:
+        with np.load(os.path.join(directory, name)) as chunk:
+            chunks.append({column: chunk[column] for column in chunk.files})
+    if not chunks:
+        return {}
+    return {column: np.concatenate([chunk[column] for chunk in chunks]) for column in chunks[0]}
+
+
+def _as_array(value):
+    if isinstance(value, Coordinates):
+        return np.array([value.x, value.y, value.z], dtype=np.float32)
+    if isinstance(value, EulerAngles):
+        return np.array([value.alpha, value.beta, value.gamma], dtype=np.float32)
+    return np.asarray(value)
+
+
+class _NpzWriter:
+
+    def __init__(self, directory):
+        self._directory = directory
+        self._index = 0
+
+    def write(self, columns):
+        path = os.path.join(self._directory, "chunk_{:05d}.npz".format(self._index))
+        np.savez(path, **columns)
+        self._index += 1
+
+    def close(self):
+        pass
+
+
+class _ParquetWriter:
+
+    def __init__(self, directory):
+        import pyarrow
+        import pyarrow.parquet
+        self._pyarrow = pyarrow
+        self._parquet = pyarrow.parquet
+        self._path = os.path.join(directory, "telemetry.parquet")
+        self._writer = None
+
+    def write(self, columns):
+        pa = self._pyarrow
+        arrays = []
+        for column in columns.values():
+            if column.ndim == 1:
+                arrays.append(pa.array(column))
+            else:
+                # Values of more than one element become fixed-size lists of the flattened values
+                flat = pa.array(np.ascontiguousarray(column).reshape(-1))
+                arrays.append(pa.FixedSizeListArray.from_arrays(flat, int(np.prod(column.shape[1:]))))
+        table = pa.Table.from_arrays(arrays, names=list(columns))
+        if self._writer is None:
+            self._writer = self._parquet.ParquetWriter(self._path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
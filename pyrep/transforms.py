@@ -0,0 +1,160 @@
+"""
+Vectorized conversions between the pose representations of V-REP.
+All functions take and return arrays with any leading (batch) dimensions:
+    * Euler angles (..., 3): alpha, beta, gamma, rotation Rx(alpha) * Ry(beta) * Rz(gamma)
+    * quaternions (..., 4): x, y, z, w, as with simxGetObjectQuaternion
+    * rotation matrices (..., 3, 3)
+    * V-REP matrices (..., 12): 3x4 matrix [R | p] row by row, as with simxGetJointMatrix
+    * homogeneous transforms (..., 4, 4)
+"""
+import numpy as np
+
+
+def euler_to_matrix(euler) -> np.ndarray:
+    euler = np.asarray(euler, dtype=np.float64)
+    ca, cb, cg = np.moveaxis(np.cos(euler), -1, 0)
+    sa, sb, sg = np.moveaxis(np.sin(euler), -1, 0)
+    matrix = np.empty(euler.shape[:-1] + (3, 3))
+    matrix[..., 0, 0] = cb * cg
+    matrix[..., 0, 1] = -cb * sg
+    matrix[..., 0, 2] = sb
+    matrix[..., 1, 0] = ca * sg + sa * sb * cg
+    matrix[..., 1, 1] = ca * cg - sa * sb * sg
+    matrix[..., 1, 2] = -sa * cb
+    matrix[..., 2, 0] = sa * sg - ca * sb * cg
+    matrix[..., 2, 1] = sa * cg + ca * sb * sg
+    matrix[..., 2, 2] = ca * cb
+    return matrix
+
+
+def matrix_to_euler(matrix) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float64)
+    euler = np.empty(matrix.shape[:-2] + (3,))
+    euler[..., 0] = np.arctan2(-matrix[..., 1, 2], matrix[..., 2, 2])
+    euler[..., 1] = np.arcsin(np.clip(matrix[..., 0, 2], -1.0, 1.0))
+    euler[..., 2] = np.arctan2(-matrix[..., 0, 1], matrix[..., 0, 0])
+    return euler
+
+
+def quaternion_to_matrix(quaternion) -> np.ndarray:
+    quaternion = np.asarray(quaternion, dtype=np.float64)
+    quaternion = quaternion / np.linalg.norm(quaternion, axis=-1, keepdims=True)
+    x, y, z, w = np.moveaxis(quaternion, -1, 0)
+    matrix = np.empty(quaternion.shape[:-1] + (3, 3))
+    matrix[..., 0, 0] = 1 - 2 * (y * y + z * z)
+    matrix[..., 0, 1] = 2 * (x * y - z * w)
+    matrix[..., 0, 2] = 2 * (x * z + y * w)
+    matrix[..., 1, 0] = 2 * (x * y + z * w)
+    matrix[..., 1, 1] = 1 - 2 * (x * x + z * z)
+    matrix[..., 1, 2] = 2 * (y * z - x * w)
+    matrix[..., 2, 0] = 2 * (x * z - y * w)
+    matrix[..., 2, 1] = 2 * (y * z + x * w)
+    matrix[..., 2, 2] = 1 - 2 * (x * x + y * y)
+    return matrix
+
+
+def matrix_to_quaternion(matrix) -> np.ndarray:
+    """
+    @return unit quaternions with w >= 0
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    m = matrix
+    trace = m[..., 0, 0] + m[..., 1, 1] + m[..., 2, 2]
+    # Each rotation uses the formula dividing by its largest quaternion component
+    candidates = np.stack([
+        np.stack([m[..., 2, 1] - m[..., 1, 2], m[..., 0, 2] - m[..., 2, 0], m[..., 1, 0] - m[..., 0, 1], 1 + trace], -1),
+        np.stack([1 + m[..., 0, 0] - m[..., 1, 1] - m[..., 2, 2], m[..., 0, 1] + m[..., 1, 0],
+                  m[..., 0, 2] + m[..., 2, 0], m[..., 2, 1] - m[..., 1, 2]], -1),
+        np.stack([m[..., 0, 1] + m[..., 1, 0], 1 - m[..., 0, 0] + m[..., 1, 1] - m[..., 2, 2],
+                  m[..., 1, 2] + m[..., 2, 1], m[..., 0, 2] - m[..., 2, 0]], -1),
+        np.stack([m[..., 0, 2] + m[..., 2, 0], m[..., 1, 2] + m[..., 2, 1],
+                  1 - m[..., 0, 0] - m[..., 1, 1] + m[..., 2, 2], m[..., 1, 0] - m[..., 0, 1]], -1),
+    ], -2)
+    diagonal = np.stack([trace, m[..., 0, 0], m[..., 1, 1], m[..., 2, 2]], -1)
+    choice = np.argmax(diagonal, axis=-1)
+    quaternion = np.take_along_axis(candidates, choice[..., np.newaxis, np.newaxis], axis=-2)[..., 0, :]
+    quaternion /= np.linalg.norm(quaternion, axis=-1, keepdims=True)
+    return np.where(quaternion[..., 3:] < 0, -quaternion, quaternion)
+
+
+def euler_to_quaternion(euler) -> np.ndarray:
+    return matrix_to_quaternion(euler_to_matrix(euler))
+
+
+def quaternion_to_euler(quaternion) -> np.ndarray:
+    return matrix_to_euler(quaternion_to_matrix(quaternion))
+
+
+def quaternion_multiply(a, b) -> np.ndarray:
+    """
+    Quaternion of the rotation b followed by a.
+    """
+    ax, ay, az, aw = np.moveaxis(np.asarray(a, dtype=np.float64), -1, 0)
+    bx, by, bz, bw = np.moveaxis(np.asarray(b, dtype=np.float64), -1, 0)
+    return np.stack([
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+        aw * bw - ax * bx - ay * by - az * bz,
+    ], -1)
+
+
+def pose(position, rotation) -> np.ndarray:
+    """
+    Homogeneous transforms of positions (..., 3) and rotation matrices (..., 3, 3).
+    """
+    position = np.asarray(position, dtype=np.float64)
+    rotation = np.asarray(rotation, dtype=np.float64)
+    shape = np.broadcast(position[..., 0], rotation[..., 0, 0]).shape
+    transform = np.zeros(shape + (4, 4))
+    transform[..., :3, :3] = rotation
+    transform[..., :3, 3] = position
+    transform[..., 3, 3] = 1.0
+    return transform
+
+
+def vrep_matrix_to_pose(matrix) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float64)
+    transform = np.zeros(matrix.shape[:-1] + (4, 4))
+    transform[..., :3, :] = matrix.reshape(matrix.shape[:-1] + (3, 4))
+    transform[..., 3, 3] = 1.0
+    return transform
+
+
+def pose_to_vrep_matrix(transform) -> np.ndarray:
+    transform = np.asarray(transform, dtype=np.float64)
+    return transform[..., :3, :].reshape(transform.shape[:-2] + (12,))
+
+
+def compose(*transforms) -> np.ndarray:
+    """
+    Product of homogeneous transforms, from left to right, with broadcasting.
+    """
+    result = np.asarray(transforms[0], dtype=np.float64)
+    for transform in transforms[1:]:
+        result = np.matmul(result, transform)
+    return result
+
+
+def invert(transform) -> np.ndarray:
+    """
+    Inverse of rigid transforms (rotation and translation).
+    """
+    transform = np.asarray(transform, dtype=np.float64)
+    rotation = np.swapaxes(transform[..., :3, :3], -1, -2)
+    inverse = np.zeros(transform.shape)
+    inverse[..., :3, :3] = rotation
+    inverse[..., :3, 3] = -np.matmul(rotation, transform[..., :3, 3, np.newaxis])[..., 0]
+    inverse[..., 3, 3] = 1.0
+    return inverse
+
+
+def transform_points(transform, points) -> np.ndarray:
+    """
+    Applies transforms (..., 4, 4) to points (..., N, 3).
+    """
+    transform = np.asarray(transform, dtype=np.float64)
+    points = np.asarray(points)
+    result = np.matmul(points, np.swapaxes(transform[..., :3, :3], -1, -2))
+    result += transform[..., np.newaxis, :3, 3]
+    return result.astype(np.result_type(points.dtype, np.float32), copy=False)
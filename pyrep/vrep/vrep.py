@@ -31,6 +31,7 @@ import struct
 import sys
 import os
 import ctypes as ct
+import numpy as np
 from .vrepConst import *
 
 #load library
@@ -165,6 +166,22 @@ c_GetObjectGroupData        = ct.CFUNCTYPE(ct.c_int32,ct.c_int32, ct.c_int32, ct
 c_GetObjectVelocity         = ct.CFUNCTYPE(ct.c_int32,ct.c_int32, ct.c_int32, ct.POINTER(ct.c_float), ct.POINTER(ct.c_float), ct.c_int32)(("simxGetObjectVelocity", libsimx))
 c_CallScriptFunction        = ct.CFUNCTYPE(ct.c_int32,ct.c_int32,ct.POINTER(ct.c_char),ct.c_int32,ct.POINTER(ct.c_char),ct.c_int32,ct.POINTER(ct.c_int32),ct.c_int32,ct.POINTER(ct.c_float),ct.c_int32,ct.POINTER(ct.c_char),ct.c_int32,ct.POINTER(ct.c_ubyte),ct.POINTER(ct.c_int32), ct.POINTER(ct.POINTER(ct.c_int32)),ct.POINTER(ct.c_int32), ct.POINTER(ct.POINTER(ct.c_float)),ct.POINTER(ct.c_int32), ct.POINTER(ct.POINTER(ct.c_char)),ct.POINTER(ct.c_int32), ct.POINTER(ct.POINTER(ct.c_ubyte)),ct.c_int32)(("simxCallScriptFunction", libsimx))
 
+#helper functions
+def _replyBytes(bufferPointer, length, copy):
+    '''
+    Returns the content of a reply buffer of the remote API as a bytearray, copied in one operation.
+    If copy is False, returns a read-only numpy uint8 view of the buffer instead. The view is only
+    valid until the same command is called again
+    '''
+    if not copy:
+        if length == 0:
+            view = np.empty(0, dtype=np.uint8)
+        else:
+            view = np.ctypeslib.as_array(bufferPointer, shape=(length,))
+        view.flags.writeable = False
+        return view
+    return bytearray(ct.string_at(bufferPointer, length))
+
 #API functions
 def simxGetJointPosition(clientID, jointHandle, operationMode):
     '''
@@ -310,6 +327,34 @@ def simxGetVisionSensorImage(clientID, sensorHandle, options, operationMode):
             reso.append(resolution[i])
     return ret, reso, image
 
+def simxGetVisionSensorImageNumpy(clientID, sensorHandle, options, operationMode, out=None):
+    '''
+    Same as simxGetVisionSensorImage, but the image is returned as a flat numpy uint8 array.
+    The C buffer is wrapped as unsigned bytes and copied once. If out (a flat, contiguous
+    uint8 array) has the size of the image, the image is copied into it and out is returned,
+    otherwise a new array is allocated.
+    '''
+
+    resolution = (ct.c_int*2)()
+    c_image  = ct.POINTER(ct.c_byte)()
+    bytesPerPixel = 3
+    if (options & 1) != 0:
+        bytesPerPixel = 1
+    ret = c_GetVisionSensorImage(clientID, sensorHandle, resolution, ct.byref(c_image), options, operationMode)
+
+    reso = []
+    image = None
+    if (ret == 0):
+        size = resolution[0] * resolution[1] * bytesPerPixel
+        view = np.ctypeslib.as_array(ct.cast(c_image, ct.POINTER(ct.c_ubyte)), shape=(size,))
+        if out is not None and out.size == size:
+            np.copyto(out, view)
+            image = out
+        else:
+            image = view.copy()
+        reso = [resolution[0], resolution[1]]
+    return ret, reso, image
+
 def simxSetVisionSensorImage(clientID, sensorHandle, image, options, operationMode):
     '''
     Please have a look at the function description/documentation in the V-REP user manual
@@ -335,6 +380,29 @@ def simxGetVisionSensorDepthBuffer(clientID, sensorHandle, operationMode):
             reso.append(resolution[i])
     return ret, reso, buffer
 
+def simxGetVisionSensorDepthBufferNumpy(clientID, sensorHandle, operationMode, out=None):
+    '''
+    Same as simxGetVisionSensorDepthBuffer, but the buffer is returned as a flat numpy float32
+    array copied from the C buffer in one operation. If out (a flat, contiguous float32 array)
+    has the size of the buffer, the values are copied into it and out is returned, otherwise
+    a new array is allocated.
+    '''
+    c_buffer  = ct.POINTER(ct.c_float)()
+    resolution = (ct.c_int*2)()
+    ret = c_GetVisionSensorDepthBuffer(clientID, sensorHandle, resolution, ct.byref(c_buffer), operationMode)
+    reso = []
+    buffer = None
+    if (ret == 0):
+        size = resolution[0] * resolution[1]
+        view = np.ctypeslib.as_array(c_buffer, shape=(size,))
+        if out is not None and out.size == size:
+            np.copyto(out, view)
+            buffer = out
+        else:
+            buffer = view.copy()
+        reso = [resolution[0], resolution[1]]
+    return ret, reso, buffer
+
 def simxGetObjectChild(clientID, parentObjectHandle, childIndex, operationMode):
     '''
     Please have a look at the function description/documentation in the V-REP user manual
@@ -968,9 +1036,10 @@ def simxGetIntegerSignal(clientID, signalName, operationMode):
         signalName=signalName.encode('utf-8')
     return c_GetIntegerSignal(clientID, signalName, ct.byref(signalValue), operationMode), signalValue.value
 
-def simxGetStringSignal(clientID, signalName, operationMode):
+def simxGetStringSignal(clientID, signalName, operationMode, copy=True):
     '''
     Please have a look at the function description/documentation in the V-REP user manual
+    If copy is False, the value is returned as a read-only numpy uint8 view of the reply buffer (see _replyBytes)
     '''
 
     signalLength = ct.c_int();
@@ -981,16 +1050,16 @@ def simxGetStringSignal(clientID, signalName, operationMode):
 
     a = bytearray()
     if ret == 0:
-        for i in range(signalLength.value):
-            a.append(signalValue[i])
-    if sys.version_info[0] != 3:
+        a = _replyBytes(signalValue, signalLength.value, copy)
+    if sys.version_info[0] != 3 and copy:
         a=str(a)
 
     return ret, a
 
-def simxGetAndClearStringSignal(clientID, signalName, operationMode):
+def simxGetAndClearStringSignal(clientID, signalName, operationMode, copy=True):
     '''
     Please have a look at the function description/documentation in the V-REP user manual
+    If copy is False, the value is returned as a read-only numpy uint8 view of the reply buffer (see _replyBytes)
     '''
 
     signalLength = ct.c_int();
@@ -1001,16 +1070,16 @@ def simxGetAndClearStringSignal(clientID, signalName, operationMode):
 
     a = bytearray()
     if ret == 0:
-        for i in range(signalLength.value):
-            a.append(signalValue[i])
-    if sys.version_info[0] != 3:
+        a = _replyBytes(signalValue, signalLength.value, copy)
+    if sys.version_info[0] != 3 and copy:
         a=str(a)
 
     return ret, a
 
-def simxReadStringStream(clientID, signalName, operationMode):
+def simxReadStringStream(clientID, signalName, operationMode, copy=True):
     '''
     Please have a look at the function description/documentation in the V-REP user manual
+    If copy is False, the value is returned as a read-only numpy uint8 view of the reply buffer (see _replyBytes)
     '''
 
     signalLength = ct.c_int();
@@ -1021,9 +1090,8 @@ def simxReadStringStream(clientID, signalName, operationMode):
 
     a = bytearray()
     if ret == 0:
-        for i in range(signalLength.value):
-            a.append(signalValue[i])
-    if sys.version_info[0] != 3:
+        a = _replyBytes(signalValue, signalLength.value, copy)
+    if sys.version_info[0] != 3 and copy:
         a=str(a)
 
     return ret, a
@@ -1275,9 +1343,10 @@ def simxCreateDummy(clientID, size, color, operationMode):
         c_color = None
     return c_CreateDummy(clientID, size, c_color, ct.byref(handle), operationMode), handle.value
 
-def simxQuery(clientID, signalName, signalValue, retSignalName, timeOutInMs):
+def simxQuery(clientID, signalName, signalValue, retSignalName, timeOutInMs, copy=True):
     '''
     Please have a look at the function description/documentation in the V-REP user manual
+    If copy is False, the reply is returned as a read-only numpy uint8 view of the reply buffer (see _replyBytes)
     '''
 
     retSignalLength = ct.c_int();
@@ -1306,9 +1375,8 @@ def simxQuery(clientID, signalName, signalValue, retSignalName, timeOutInMs):
 
     a = bytearray()
     if ret == 0:
-        for i in range(retSignalLength.value):
-            a.append(retSignalValue[i])
-    if sys.version_info[0] != 3:
+        a = _replyBytes(retSignalValue, retSignalLength.value, copy)
+    if sys.version_info[0] != 3 and copy:
         a=str(a)
 
     return ret, a
@@ -1333,26 +1401,15 @@ def simxGetObjectGroupData(clientID, objectType, dataType, operationMode):
     ret = c_GetObjectGroupData(clientID, objectType, dataType, ct.byref(handlesC), ct.byref(handlesP), ct.byref(intDataC), ct.byref(intDataP), ct.byref(floatDataC), ct.byref(floatDataP), ct.byref(stringDataC), ct.byref(stringDataP), operationMode)
 
     if ret == 0:
-        for i in range(handlesC.value):
-            handles.append(handlesP[i])
-        for i in range(intDataC.value):
-            intData.append(intDataP[i])
-        for i in range(floatDataC.value):
-            floatData.append(floatDataP[i])
-        s = 0
+        handles = handlesP[:handlesC.value]
+        intData = intDataP[:intDataC.value]
+        floatData = floatDataP[:floatDataC.value]
+        s = ct.cast(stringDataP, ct.c_void_p).value
         for i in range(stringDataC.value):
-            a = bytearray()
-            while stringDataP[s] != b'\0':
-                if sys.version_info[0] == 3:
-                    a.append(int.from_bytes(stringDataP[s],'big'))
-                else:
-                    a.append(stringDataP[s])
-                s += 1
-            s += 1 #skip null
+            a = ct.string_at(s)
+            s += len(a) + 1 #skip null
             if sys.version_info[0] == 3:
                 a=str(a,'utf-8')
-            else:
-                a=str(a)
             stringData.append(a)
 
     return ret, handles, intData, floatData, stringData
@@ -1458,47 +1515,43 @@ def simxPackInts(intList):
     Please have a look at the function description/documentation in the V-REP user manual
     '''
 
+    if isinstance(intList, np.ndarray):
+        s=np.ascontiguousarray(intList, dtype='<i4').tobytes()
+    else:
+        s=struct.pack('<%di' % len(intList), *intList)
     if sys.version_info[0] == 3:
-        s=bytes()
-        for i in range(len(intList)):
-            s=s+struct.pack('<i',intList[i])
         s=bytearray(s)
-    else:
-        s=''
-        for i in range(len(intList)):
-            s+=struct.pack('<i',intList[i])
     return s
 
-def simxUnpackInts(intsPackedInString):
+def simxUnpackInts(intsPackedInString, asArray=False):
     '''
     Please have a look at the function description/documentation in the V-REP user manual
+    If asArray is True, the values are returned as a numpy int32 array sharing the memory of the input
     '''
-    b=[]
-    for i in range(int(len(intsPackedInString)/4)):
-        b.append(struct.unpack('<i',intsPackedInString[4*i:4*(i+1)])[0])
-    return b
+    count=len(intsPackedInString)//4
+    if asArray:
+        return np.frombuffer(intsPackedInString, dtype='<i4', count=count)
+    return list(struct.unpack_from('<%di' % count, intsPackedInString))
 
 def simxPackFloats(floatList):
     '''
     Please have a look at the function description/documentation in the V-REP user manual
     '''
 
+    if isinstance(floatList, np.ndarray):
+        s=np.ascontiguousarray(floatList, dtype='<f4').tobytes()
+    else:
+        s=struct.pack('<%df' % len(floatList), *floatList)
     if sys.version_info[0] == 3:
-        s=bytes()
-        for i in range(len(floatList)):
-            s=s+struct.pack('<f',floatList[i])
         s=bytearray(s)
-    else:
-        s=''
-        for i in range(len(floatList)):
-            s+=struct.pack('<f',floatList[i])
     return s
 
-def simxUnpackFloats(floatsPackedInString):
+def simxUnpackFloats(floatsPackedInString, asArray=False):
     '''
     Please have a look at the function description/documentation in the V-REP user manual
+    If asArray is True, the values are returned as a numpy float32 array sharing the memory of the input
     '''
-    b=[]
-    for i in range(int(len(floatsPackedInString)/4)):
-        b.append(struct.unpack('<f',floatsPackedInString[4*i:4*(i+1)])[0])
-    return b
+    count=len(floatsPackedInString)//4
+    if asArray:
+        return np.frombuffer(floatsPackedInString, dtype='<f4', count=count)
+    return list(struct.unpack_from('<%df' % count, floatsPackedInString))
@@ -0,0 +1,87 @@
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pyrep.vrep import vrepConst as vc
+from pyrep.api import VRepApi
+from pyrep.fake import FakeBackend
+from pyrep.recorder import StreamRecorder, read_log
+from pyrep.replay import ReplayBackend
+
+SCENE = os.path.join(ROOT, "examples", "pioneer_scene.json")
+
+
+class RecorderTest(unittest.TestCase):
+
+    def test_log_of_killed_recording_is_readable(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # More records than the preallocated capacity, so the files have grown
+            script = textwrap.dedent("""
+                import os, sys
+                sys.path.insert(0, {root!r})
+                from pyrep.recorder import StreamRecorder
+                recorder = StreamRecorder({directory!r}, capacity=4)
+                for i in range(10):
+                    recorder.record("simxGetJointPosition", 7, 50 * i, (0, float(i)))
+                    recorder.record("simxGetObjectPosition", 3, 50 * i, (0, [i, 2.0 * i, 0.5]))
+                os._exit(0)
+            """).format(root=ROOT, directory=directory)
+            subprocess.check_call([sys.executable, "-c", script])
+            streams = {stream.function: stream for stream in read_log(directory)}
+            self.assertEqual(set(streams), {"simxGetJointPosition", "simxGetObjectPosition"})
+            joint = streams["simxGetJointPosition"].records
+            np.testing.assert_array_equal(joint["time"], 50 * np.arange(10))
+            np.testing.assert_array_equal(joint["position"], np.arange(10))
+            positions = streams["simxGetObjectPosition"].records["position"]
+            np.testing.assert_array_equal(positions[:, 1], 2.0 * np.arange(10))
+
+    def test_buffer_reads_of_the_same_reply_are_recorded_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            api = VRepApi.connect("127.0.0.1", 19997, synchronous=True, backend=FakeBackend(SCENE),
+                                  instrument=True, recorder=StreamRecorder(directory))
+            motor = api.joint.with_velocity_control("Pioneer_p3dx_leftMotor")
+            api.simulation.start()
+            api.subscribe(motor.get_position).wait_ready()
+            for _ in range(3):
+                api.simulation.step()
+                for _ in range(5):
+                    motor.get_position(op_mode=vc.simx_opmode_buffer)
+            api.close_connection()
+            stats = api.stats()
+            times = read_log(directory)[0].records["time"]
+            self.assertEqual(len(np.unique(times)), len(times))
+            self.assertIn("simxGetJointPosition", stats)
+            self.assertNotIn("simxGetLastCmdTime", stats)
+
+    def test_positions_are_recorded_and_replayed_by_reference_frame(self):
+        with tempfile.TemporaryDirectory() as directory:
+            api = VRepApi.connect("127.0.0.1", 19997, synchronous=True, backend=FakeBackend(SCENE),
+                                  recorder=StreamRecorder(directory))
+            robot = api.handles.get("Pioneer_p3dx")
+            sensor = api.handles.get("Pioneer_p3dx_ultrasonicSensor1")
+            api.simulation.start()
+            api.simulation.step()
+            _, world = api._backend.simxGetObjectPosition(api._id, sensor, -1, vc.simx_opmode_oneshot_wait)
+            _, local = api._backend.simxGetObjectPosition(api._id, sensor, robot, vc.simx_opmode_oneshot_wait)
+            api.close_connection()
+            frames = sorted(stream.relative_to for stream in read_log(directory))
+            self.assertEqual(frames, sorted([-1, robot]))
+            replay = ReplayBackend(directory)
+            replay.seek(replay.duration)
+            for frame, expected in ((-1, world), (robot, local)):
+                code, position = replay.simxGetObjectPosition(0, sensor, frame, vc.simx_opmode_buffer)
+                self.assertEqual(code, vc.simx_return_ok)
+                np.testing.assert_allclose(position, expected, rtol=1e-6)
+            code, _ = replay.simxGetObjectPosition(0, sensor, sensor, vc.simx_opmode_buffer)
+            self.assertEqual(code, vc.simx_return_novalue_flag)
+
+
+if __name__ == "__main__":
+    unittest.main()